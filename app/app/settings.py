@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -60,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ConcurrencyLimitMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +77,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'app.urls'
 
+# Share of requests measured by RequestMetricsMiddleware, from 0 to 1
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get("REQUEST_METRICS_SAMPLE_RATE", 1.0))
+
+# Add the measurements of sampled requests as a Server-Timing header, which staff users always get.
+# Off by default outside DEBUG, as it tells every client the time spent per stage
+SERVER_TIMING_HEADER = bool(int(os.environ.get("SERVER_TIMING_HEADER", DEBUG)))
+
+# Sampled requests slower than this are logged with their query fingerprints
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", 500))
+
+# Bearer token required to scrape /metrics/, left open when empty
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -92,19 +108,69 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# wsgi runs uWSGI, asgi runs uvicorn, see scripts/run.sh
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+
+# Serve the recipe, tag and ingredient reads as coroutines, see core.async_views
+ASYNC_READ_VIEWS = bool(int(os.environ.get("ASYNC_READ_VIEWS", SERVER_MODE == "asgi")))
+
+# Requests handled at once by an ASGI worker, each may hold a thread and a database connection
+ASGI_MAX_CONCURRENT_REQUESTS = int(os.environ.get("ASGI_MAX_CONCURRENT_REQUESTS", 16))
+
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Set DB_PGBOUNCER=1 when DB_HOST points at PgBouncer in transaction pooling mode
+DB_PGBOUNCER = bool(int(os.environ.get("DB_PGBOUNCER", 0)))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.environ.get("DB_NAME"),
         'HOST': os.environ.get("DB_HOST"),
+        'PORT': os.environ.get("DB_PORT", ''),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASSWORD"),
+        # Keep connections open between requests, checking them before reuse
+        'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': bool(int(os.environ.get("DB_CONN_HEALTH_CHECKS", 1))),
+        # Server-side cursors do not survive transaction pooling
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    # Holds the token auth cache, so must be shared too or deleted tokens and deactivated users
+    # keep authenticating on the other workers for up to TOKEN_AUTH_CACHE_TTL
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get("CACHE_LOCATION", 'default'),
+    },
+    # Must be shared by all workers (e.g. FileBasedCache) for invalidation to reach them
+    'responses': {
+        'BACKEND': os.environ.get("RESPONSE_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get("RESPONSE_CACHE_LOCATION", 'responses'),
+    },
+}
+
+# Cache alias and TTL (seconds) used by core.authentication.CachedTokenAuthentication
+TOKEN_AUTH_CACHE = os.environ.get("TOKEN_AUTH_CACHE", 'default')
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get("TOKEN_AUTH_CACHE_TTL", 300))
+
+# Cache alias and TTL (seconds) used by recipe.cache for the list endpoints
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", 'responses')
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 600))
+
+# Cache alias and TTL (seconds) of the readiness probe results served at /health/ready/
+HEALTH_CHECK_CACHE = os.environ.get("HEALTH_CHECK_CACHE", 'default')
+HEALTH_CHECK_CACHE_TTL = int(os.environ.get("HEALTH_CHECK_CACHE_TTL", 5))
+
+# Text search configuration used for Recipe.search_vector
+SEARCH_CONFIG = os.environ.get("SEARCH_CONFIG", 'english')
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -145,6 +211,10 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Resized recipe image variants are generated by a thread pool in each worker
+IMAGE_PROCESSING_ASYNC = bool(int(os.environ.get("IMAGE_PROCESSING_ASYNC", 1)))
+IMAGE_PROCESSING_WORKERS = int(os.environ.get("IMAGE_PROCESSING_WORKERS", 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -154,8 +224,29 @@ AUTH_USER_MODEL = "core.User"
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.RecipeCursorPagination',
+    'PAGE_SIZE': int(os.environ.get("API_PAGE_SIZE", 50)),
 }
 
+# Serialize recipe lists from .values() rows instead of model instances, set to 0 to use RecipeSerializer
+RECIPE_LIST_FROM_VALUES = bool(int(os.environ.get("RECIPE_LIST_FROM_VALUES", 1)))
+
+# Upper bound for the ?page_size= query parameter
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 200))
+
+# Upper bound for the number of items sent to /api/recipe/recipes/bulk/
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get("RECIPE_BULK_MAX_ITEMS", 5000))
+
+# Default and maximum number of tags/ingredients returned by the suggest endpoints
+SUGGEST_LIMIT = int(os.environ.get("SUGGEST_LIMIT", 10))
+SUGGEST_MAX_LIMIT = int(os.environ.get("SUGGEST_MAX_LIMIT", 50))
+# Best name matches whose usage is counted to rank the returned suggestions, at least the limit
+SUGGEST_CANDIDATES = int(os.environ.get("SUGGEST_CANDIDATES", 50))
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
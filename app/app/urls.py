@@ -22,6 +22,8 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 import core.views
 
+health_views = core.views.get_health_views()
+
 urlpatterns = [
     path('', RedirectView.as_view(url='api/docs/')),
     # path('favicon.ico', RedirectView.as_view(url='api/docs/')),
@@ -31,7 +33,10 @@ urlpatterns = [
          SpectacularSwaggerView.as_view(), name="api_docs"),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-    path('health/', core.views.get_health_check_view, name='health'),
+    path('health/', health_views['health'], name='health'),
+    path('health/live/', health_views['health-live'], name='health-live'),
+    path('health/ready/', health_views['health-ready'], name='health-ready'),
+    path('metrics/', core.views.get_metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,105 @@
+"""
+Coroutine dispatch of DRF viewset read actions for the ASGI serving mode
+
+DRF 3.14 only dispatches synchronously, and Django runs such views on a thread
+per request under ASGI. With ASYNC_READ_VIEWS the mixed-in viewsets serve their
+read actions as coroutines instead, reusing DRF's request parsing, permissions,
+content negotiation, exception handling and rendering. The other actions keep
+going through the synchronous view.
+"""
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from django.utils.decorators import classonlymethod
+from rest_framework.response import Response
+
+from core.authentication import aperform_authentication
+
+
+async def aget_serializer_data(serializer):
+    """Return serializer.data, awaiting the serializers that fetch related rows themselves"""
+    if hasattr(serializer, "adata"):
+        return await serializer.adata()
+    return serializer.data
+
+
+class AsyncReadViewSetMixin:
+    """Serve async_actions as coroutines when ASYNC_READ_VIEWS is set
+
+    Every async action "x" is implemented by an "ax" coroutine method. Querysets
+    must load everything the serializer reads, as lazy queries cannot run on
+    the event loop.
+    """
+    async_actions = ("list", "retrieve",)
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        method_actions = {method: action for method, action in actions.items() if action in cls.async_actions}
+        if "get" in method_actions and "head" not in actions:
+            method_actions["head"] = method_actions["get"]
+        if not settings.ASYNC_READ_VIEWS or len(method_actions) == 0:
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method.lower() not in method_actions:
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = {**actions, **method_actions}
+            # Bound like ViewSetMixin does, the Allow header lists them
+            for method, action in self.action_map.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # Keeps cls, initkwargs, actions and csrf_exempt, which the router and middleware read
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch awaiting the authentication and the action"""
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+            response = await getattr(self, f"a{self.action}")(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        # The paginator evaluates the page slice itself, Django's async ORM would hop to a thread the same way
+        return await sync_to_async(self.paginate_queryset)(queryset)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(await aget_serializer_data(serializer))
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(await aget_serializer_data(serializer))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(await self.aget_object())
+        return Response(serializer.data)
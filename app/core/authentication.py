@@ -0,0 +1,119 @@
+"""
+Token authentication with cached token -> user resolution
+"""
+import hashlib
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.request import Request
+
+from core.stats import CacheStats
+
+token_cache_stats = CacheStats("token")
+
+
+def get_token_cache():
+    return caches[settings.TOKEN_AUTH_CACHE]
+
+
+def get_token_cache_key(key: str) -> str:
+    """Return the cache key for a token without storing the raw token"""
+    return "auth:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in TokenAuthentication that caches the resolved (user, token) pair"""
+
+    def get_token_key(self, request) -> Optional[str]:
+        """Return the key sent in the Authorization header, None when the header is for another scheme"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(_("Invalid token header. No credentials provided."))
+        elif len(auth) > 2:
+            raise AuthenticationFailed(_("Invalid token header. Token string should not contain spaces."))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_("Invalid token header. Token string should not contain invalid characters."))
+
+    def authenticate(self, request):
+        key = self.get_token_key(request)
+        return self.authenticate_credentials(key) if key is not None else None
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = get_token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            token_cache_stats.record_hit()
+            return cached
+        token_cache_stats.record_miss()
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), settings.TOKEN_AUTH_CACHE_TTL)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """Async counterpart of authenticate, reading through the async cache and ORM APIs"""
+        key = self.get_token_key(request)
+        if key is None:
+            return None
+        cache = get_token_cache()
+        cache_key = get_token_cache_key(key)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            token_cache_stats.record_hit()
+            return cached
+        token_cache_stats.record_miss()
+        try:
+            token = await self.get_model().objects.select_related("user").aget(key=key)
+        except self.get_model().DoesNotExist:
+            raise AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        await cache.aset(cache_key, (token.user, token), settings.TOKEN_AUTH_CACHE_TTL)
+        return token.user, token
+
+
+async def aperform_authentication(request: Request):
+    """Resolve request.user like Request._authenticate does, awaiting authenticators that support it
+
+    Afterwards request.user is set, so DRF does not authenticate again synchronously.
+    """
+    for authenticator in request.authenticators:
+        try:
+            if hasattr(authenticator, "aauthenticate"):
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            else:
+                user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+        except APIException:
+            request._not_authenticated()
+            raise
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+    request._not_authenticated()
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=Token)
+def invalidate_token(sender, instance: Token, **kwargs):
+    get_token_cache().delete(get_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Drop cached tokens of a changed user, e.g. after deactivation"""
+    keys = Token.objects.filter(user_id=instance.pk).values_list("key", flat=True)
+    get_token_cache().delete_many([get_token_cache_key(key) for key in keys])
@@ -0,0 +1,3 @@
+"""
+Benchmark suite for the API, run with `python manage.py benchmark`
+"""
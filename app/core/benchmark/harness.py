@@ -0,0 +1,172 @@
+"""
+Timing, query and allocation measurements reported in the pytest-benchmark JSON layout
+"""
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def compute_stats(timings: list[float]) -> dict:
+    """Return summary statistics of round timings in seconds"""
+    ordered = sorted(timings)
+    if len(ordered) > 1:
+        q1, _, q3 = statistics.quantiles(ordered, n=4)
+        p95 = statistics.quantiles(ordered, n=20)[-1]
+        stddev = statistics.stdev(ordered)
+    else:
+        q1 = q3 = p95 = ordered[0]
+        stddev = 0.0
+    mean = statistics.fmean(ordered)
+    return {
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": mean,
+        "stddev": stddev,
+        "median": statistics.median(ordered),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "p95": p95,
+        "rounds": len(ordered),
+        "total": sum(ordered),
+        "ops": 1 / mean if mean > 0 else 0.0,
+    }
+
+
+class BenchmarkFixture:
+    """Runs a target repeatedly and records its timings, like pytest-benchmark's benchmark fixture
+
+    Queries and allocations are measured on one extra, untimed round so that
+    the instrumentation does not skew the timings.
+    """
+
+    def __init__(self, name: str, group: str, params: dict, rounds: int, warmup_rounds: int):
+        self.name = name
+        self.group = group
+        self.params = params
+        self.rounds = rounds
+        self.warmup_rounds = warmup_rounds
+        self.stats = None
+        self.extra_info = {}
+
+    @property
+    def fullname(self) -> str:
+        param = ",".join(f"{key}={value}" for key, value in self.params.items())
+        return f"{self.group}.{self.name}[{param}]"
+
+    def __call__(self, target, *args, **kwargs):
+        return self.pedantic(target, args=args, kwargs=kwargs)
+
+    def pedantic(self, target, args: tuple = (), kwargs: dict = None, setup=None, teardown=None,
+                 rounds: int = None):
+        """Time target(*args, **kwargs)
+
+        setup runs untimed before every round and may return the (args, kwargs) to use.
+        teardown runs untimed after every round with the target's result.
+        rounds caps the configured number of rounds, e.g. for slow targets.
+        """
+        def run(measure):
+            call_args, call_kwargs = args, kwargs or {}
+            if setup is not None:
+                prepared = setup()
+                if prepared is not None:
+                    call_args, call_kwargs = prepared
+            result = measure(lambda: target(*call_args, **call_kwargs))
+            if teardown is not None:
+                teardown(result)
+            return result
+
+        timings = []
+
+        def timed(call):
+            start = time.perf_counter()
+            result = call()
+            timings.append(time.perf_counter() - start)
+            return result
+
+        def instrumented(call):
+            tracemalloc.start()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    result = call()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.extra_info.update(queries=len(queries), alloc_peak_bytes=peak, alloc_net_bytes=current)
+            return result
+
+        for _ in range(self.warmup_rounds):
+            run(lambda call: call())
+        for _ in range(self.rounds if rounds is None else min(rounds, self.rounds)):
+            run(timed)
+        self.stats = compute_stats(timings)
+        return run(instrumented)
+
+    def as_dict(self) -> dict:
+        return {
+            "group": self.group,
+            "name": self.name,
+            "fullname": self.fullname,
+            "params": self.params,
+            "param": ",".join(str(value) for value in self.params.values()),
+            "extra_info": self.extra_info,
+            "stats": self.stats,
+        }
+
+
+def get_machine_info() -> dict:
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "python_implementation": platform.python_implementation(),
+        "python_version": platform.python_version(),
+        "django_version": django.get_version(),
+        "database": connection.vendor,
+        "conn_max_age": settings.DATABASES["default"].get("CONN_MAX_AGE", 0),
+    }
+
+
+def get_commit_info() -> dict:
+    """Return the current git commit, or nulls outside a git checkout"""
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"id": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+                "dirty": git("status", "--porcelain") != ""}
+    except (OSError, subprocess.CalledProcessError):
+        return {"id": None, "branch": None, "dirty": None}
+
+
+def make_report(benchmarks: list[BenchmarkFixture]) -> dict:
+    return {
+        "machine_info": get_machine_info(),
+        "commit_info": get_commit_info(),
+        "datetime": datetime.now(timezone.utc).isoformat(),
+        "benchmarks": [benchmark.as_dict() for benchmark in benchmarks],
+    }
+
+
+def compare_reports(report: dict, baseline: dict, max_ratio: float) -> list[dict]:
+    """Return the benchmarks whose median latency grew by more than max_ratio, or that run more queries"""
+    previous = {benchmark["fullname"]: benchmark for benchmark in baseline["benchmarks"]}
+    regressions = []
+    for benchmark in report["benchmarks"]:
+        old = previous.get(benchmark["fullname"])
+        if old is None:
+            continue
+        ratio = benchmark["stats"]["median"] / old["stats"]["median"] if old["stats"]["median"] > 0 else 1.0
+        queries, old_queries = benchmark["extra_info"]["queries"], old["extra_info"]["queries"]
+        if ratio > max_ratio or queries > old_queries:
+            regressions.append({"fullname": benchmark["fullname"], "ratio": ratio,
+                                "queries": queries, "baseline_queries": old_queries})
+    return regressions
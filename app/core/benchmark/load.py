@@ -0,0 +1,123 @@
+"""
+Concurrent keep-alive HTTP/1.1 load against a running server
+
+Every connection sends its next request as soon as the previous response is
+read, like a closed-loop client. A minimal client on asyncio streams keeps
+thousands of connections cheap for the load generator itself.
+"""
+import asyncio
+import itertools
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from core.benchmark.harness import compute_stats
+
+# Pause before reconnecting after a refused or reset connection
+RECONNECT_DELAY = 0.05
+
+
+class LoadResult:
+    """Latencies and outcomes of every request sent during a load run"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = {}
+        self.reconnects = 0
+        self.duration = 0.0
+
+    def record(self, status: int, latency: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency)
+
+    def record_error(self, exc: Exception):
+        name = type(exc).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def as_dict(self) -> dict:
+        stats = compute_stats(self.latencies) if len(self.latencies) != 0 else None
+        if stats is not None and len(self.latencies) > 1:
+            stats["p99"] = statistics.quantiles(self.latencies, n=100)[-1]
+        return {
+            "requests": len(self.latencies),
+            "throughput": len(self.latencies) / self.duration if self.duration else 0.0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "latency": stats,
+        }
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    """Read one response, returning its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by the server")
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def run_connection(host: str, port: int, requests, deadline: float, result: LoadResult):
+    """Send requests over one connection until the deadline, reconnecting after failures"""
+    writer, served = None, 0
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+                served = 0
+            request = next(requests)
+            start = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            result.record(status, time.perf_counter() - start)
+            served += 1
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+            if writer is not None:
+                writer.close()
+                writer = None
+            # A server may close a kept-alive connection between responses, only a fresh one failing is an error
+            if isinstance(exc, ConnectionResetError) and served != 0:
+                result.reconnects += 1
+                continue
+            result.record_error(exc)
+            await asyncio.sleep(RECONNECT_DELAY)
+    if writer is not None:
+        writer.close()
+
+
+def build_request(host: str, path: str, headers: dict) -> bytes:
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}", *(f"{name}: {value}" for name, value in headers.items())]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def run_load(url: str, paths: list[str], connections: int, duration: float, headers: dict = None) -> LoadResult:
+    """Keep connections busy with GETs of the paths, round robin, for duration seconds"""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    requests = itertools.cycle([build_request(parts.netloc, path, headers or {}) for path in paths])
+    result = LoadResult()
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(run_connection(host, port, requests, deadline, result) for _ in range(connections)))
+    result.duration = time.monotonic() - start
+    return result
@@ -0,0 +1,83 @@
+"""
+Synthetic benchmark users owning a given number of recipes, tags and ingredients
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from core.models import Ingredient, Recipe, Tag, User
+from core.search import refresh_search_vectors
+from recipe.cache import invalidate_user
+
+BENCH_PASSWORD = "benchpass123"
+
+# Rows inserted per statement
+SEED_BATCH_SIZE = 5000
+
+# Tags and ingredients linked to every recipe
+LINKS_PER_RECIPE = 3
+
+WORDS = ("chocolate", "tomato", "garlic", "lemon", "basil", "rice", "chicken", "mushroom", "pepper", "honey",
+         "ginger", "spinach", "salmon", "vanilla", "cheese", "potato", "onion", "apple", "curry", "noodle")
+
+
+def get_bench_email(size: int) -> str:
+    return f"bench-{size}@example.com"
+
+
+def get_bench_user(size: int) -> User:
+    """Return the benchmark user owning size recipes, seeding it when missing or outdated"""
+    user = get_user_model().objects.filter(email=get_bench_email(size)).first()
+    if user is not None and Recipe.objects.filter(user=user).count() == size:
+        return user
+    if user is not None:
+        user.delete()
+    return seed_user(size)
+
+
+@transaction.atomic
+def seed_user(size: int) -> User:
+    """Create a user with size recipes, size/20 tags and size/10 ingredients, each recipe linked to a few"""
+    rng = random.Random(size)
+    user = get_user_model().objects.create_user(get_bench_email(size), BENCH_PASSWORD, name=f"Bench {size}")
+    Token.objects.create(user=user)
+
+    def words(count: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(count))
+
+    Tag.objects.bulk_create(
+        [Tag(user=user, name=f"{words(1)} {i}") for i in range(max(LINKS_PER_RECIPE, size // 20))],
+        batch_size=SEED_BATCH_SIZE)
+    Ingredient.objects.bulk_create(
+        [Ingredient(user=user, name=f"{words(1)} {i}") for i in range(max(LINKS_PER_RECIPE, size // 10))],
+        batch_size=SEED_BATCH_SIZE)
+    Recipe.objects.bulk_create(
+        [Recipe(user=user, title=words(3).capitalize(), description=words(12), time_minutes=rng.randint(1, 240),
+                price=Decimal(rng.randint(50, 9999)) / 100, link=f"https://example.com/recipes/{i}")
+         for i in range(size)],
+        batch_size=SEED_BATCH_SIZE)
+
+    recipe_ids = list(Recipe.objects.filter(user=user).values_list("id", flat=True))
+    for model, through, column in ((Tag, Recipe.tags.through, "tag_id"),
+                                   (Ingredient, Recipe.ingredients.through, "ingredient_id")):
+        linked_ids = list(model.objects.filter(user=user).values_list("id", flat=True))
+        through.objects.bulk_create(
+            [through(recipe_id=recipe_id, **{column: linked_id})
+             for recipe_id in recipe_ids for linked_id in rng.sample(linked_ids, LINKS_PER_RECIPE)],
+            batch_size=SEED_BATCH_SIZE)
+
+    refresh_search_vectors(Recipe.objects.filter(user=user).values("id"))
+    # bulk_create sends no signals, so drop cached responses explicitly
+    invalidate_user(user.id)
+    return user
+
+
+def delete_bench_users() -> int:
+    """Delete every benchmark user with their recipes, returning how many users were deleted"""
+    users = get_user_model().objects.filter(email__startswith="bench-", email__endswith="@example.com")
+    count = users.count()
+    users.delete()
+    return count
@@ -0,0 +1,316 @@
+"""
+Benchmarks of the recipe, tag, ingredient and user endpoints
+
+Every benchmark takes the pytest-benchmark style `benchmark` fixture and a
+BenchContext holding a seeded user and a token-authenticated client.
+"""
+import time
+from io import BytesIO
+from itertools import count
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.benchmark.seed import BENCH_PASSWORD, WORDS
+from core.images import get_queue_depth
+from core.models import Ingredient, Recipe, Tag, User
+
+BENCHMARKS = []
+
+# Round caps for targets taking seconds, e.g. password hashing or exporting every recipe
+SLOW_ROUNDS = 3
+
+_unique = count()
+
+
+def benchmark_case(group: str, name: str = None):
+    """Register a benchmark function under group"""
+    def decorator(func):
+        BENCHMARKS.append((group, name or func.__name__, func))
+        return func
+    return decorator
+
+
+class BenchContext:
+    """A seeded user with a token-authenticated client and a few of its object ids"""
+
+    def __init__(self, user: User, size: int):
+        self.user = user
+        self.size = size
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.recipe_id = Recipe.objects.filter(user=user).order_by("id").values_list("id", flat=True).first()
+        self.tag_ids = list(Tag.objects.filter(user=user).order_by("id").values_list("id", flat=True)[:2])
+        self.ingredient_ids = list(Ingredient.objects.filter(user=user).order_by("id").values_list("id", flat=True)[:2])
+
+    def request(self, method: str, url: str, data=None, expected_status: int = 200, **extra):
+        """Send a request, failing the benchmark if the endpoint did not answer as expected"""
+        response = getattr(self.client, method)(url, data, **extra)
+        if response.status_code != expected_status:
+            raise AssertionError(f"{method.upper()} {url} answered {response.status_code}, "
+                                 f"expected {expected_status}: {response.content[:200]!r}")
+        return response
+
+    def get(self, url: str, params: dict = None, expected_status: int = 200, **extra):
+        return self.request("get", url, params, expected_status, **extra)
+
+
+def clear_response_cache():
+    caches[settings.RESPONSE_CACHE].clear()
+
+
+def wait_for_image_queue():
+    """Wait for queued image processing, so it does not run during the next timed rounds"""
+    while get_queue_depth() > 0:
+        time.sleep(0.01)
+
+
+def recipe_url(recipe_id: int) -> str:
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def recipe_payload() -> dict:
+    n = next(_unique)
+    return {"title": f"Bench recipe {n}", "time_minutes": 20, "price": "7.50",
+            "tags": [{"name": f"bench tag {n % 5}"}], "ingredients": [{"name": f"bench ingredient {n % 7}"}]}
+
+
+def create_recipe(ctx: BenchContext) -> Recipe:
+    return Recipe.objects.create(user=ctx.user, title="Bench recipe", time_minutes=10, price="5.00")
+
+
+def delete_created(response):
+    Recipe.objects.filter(id=response.data["id"]).delete()
+
+
+RECIPE_LISTS = {
+    "recipe_list": {},
+    "recipe_list_sparse": {"fields": "id,title"},
+    "recipe_list_range_ordering": {"time_minutes__lte": 60, "ordering": "-price"},
+    "recipe_list_search": {"search": WORDS[0]},
+}
+
+for list_name, list_params in RECIPE_LISTS.items():
+    def bench_recipe_list(benchmark, ctx: BenchContext, params=list_params):
+        benchmark.pedantic(ctx.get, args=(reverse("recipe:recipe-list"), params), setup=clear_response_cache)
+
+    benchmark_case("recipes", list_name)(bench_recipe_list)
+
+
+@benchmark_case("recipes")
+def recipe_list_cached(benchmark, ctx: BenchContext):
+    benchmark(ctx.get, reverse("recipe:recipe-list"))
+
+
+@benchmark_case("recipes")
+def recipe_list_filter_any(benchmark, ctx: BenchContext):
+    params = {"tags": ",".join(map(str, ctx.tag_ids))}
+    benchmark.pedantic(ctx.get, args=(reverse("recipe:recipe-list"), params), setup=clear_response_cache)
+
+
+@benchmark_case("recipes")
+def recipe_list_filter_all(benchmark, ctx: BenchContext):
+    params = {"tags": ",".join(map(str, ctx.tag_ids)), "match": "all"}
+    benchmark.pedantic(ctx.get, args=(reverse("recipe:recipe-list"), params), setup=clear_response_cache)
+
+
+@benchmark_case("recipes")
+def recipe_retrieve(benchmark, ctx: BenchContext):
+    benchmark(ctx.get, recipe_url(ctx.recipe_id))
+
+
+@benchmark_case("recipes")
+def recipe_retrieve_not_modified(benchmark, ctx: BenchContext):
+    etag = ctx.get(recipe_url(ctx.recipe_id))["ETag"]
+    benchmark(ctx.get, recipe_url(ctx.recipe_id), expected_status=304, HTTP_IF_NONE_MATCH=etag)
+
+
+@benchmark_case("recipes")
+def recipe_create(benchmark, ctx: BenchContext):
+    benchmark.pedantic(ctx.request, setup=lambda: (("post", reverse("recipe:recipe-list"), recipe_payload()),
+                                                   {"expected_status": 201, "format": "json"}),
+                       teardown=delete_created)
+
+
+@benchmark_case("recipes")
+def recipe_update(benchmark, ctx: BenchContext):
+    benchmark.pedantic(ctx.request, setup=lambda: (("put", recipe_url(ctx.recipe_id), recipe_payload()),
+                                                   {"format": "json"}))
+
+
+@benchmark_case("recipes")
+def recipe_partial_update(benchmark, ctx: BenchContext):
+    benchmark.pedantic(ctx.request, setup=lambda: (("patch", recipe_url(ctx.recipe_id),
+                                                    {"title": f"Bench recipe {next(_unique)}"}), {"format": "json"}))
+
+
+@benchmark_case("recipes")
+def recipe_destroy(benchmark, ctx: BenchContext):
+    benchmark.pedantic(ctx.request, setup=lambda: (("delete", recipe_url(create_recipe(ctx).id)),
+                                                   {"expected_status": 204}))
+
+
+@benchmark_case("recipes")
+def recipe_upload_image(benchmark, ctx: BenchContext):
+    def setup():
+        image_file = BytesIO()
+        Image.new("RGB", (800, 600)).save(image_file, format="JPEG")
+        image_file.name = "bench.jpg"
+        image_file.seek(0)
+        url = reverse("recipe:recipe-upload-image", args=[create_recipe(ctx).id])
+        return ("post", url, {"image": image_file}), {"format": "multipart"}
+
+    def teardown(response):
+        wait_for_image_queue()
+        delete_created(response)
+
+    benchmark.pedantic(ctx.request, setup=setup, teardown=teardown)
+
+
+@benchmark_case("recipes")
+def recipe_bulk_create(benchmark, ctx: BenchContext):
+    def teardown(response):
+        Recipe.objects.filter(id__in=[result["id"] for result in response.data["results"]]).delete()
+
+    benchmark.pedantic(ctx.request, setup=lambda: (("post", reverse("recipe:recipe-bulk"),
+                                                    [recipe_payload() for _ in range(100)]), {"format": "json"}),
+                       teardown=teardown)
+
+
+@benchmark_case("recipes")
+def recipe_bulk_update(benchmark, ctx: BenchContext):
+    recipe_ids = list(Recipe.objects.filter(user=ctx.user).order_by("id").values_list("id", flat=True)[:100])
+    benchmark.pedantic(ctx.request, setup=lambda: (("patch", reverse("recipe:recipe-bulk"),
+                                                    [{"id": recipe_id, "time_minutes": next(_unique) % 240 + 1}
+                                                     for recipe_id in recipe_ids]), {"format": "json"}))
+
+
+@benchmark_case("recipes")
+def recipe_bulk_delete(benchmark, ctx: BenchContext):
+    def setup():
+        recipe_ids = [create_recipe(ctx).id for _ in range(100)]
+        return ("delete", reverse("recipe:recipe-bulk"), recipe_ids), {"format": "json"}
+
+    benchmark.pedantic(ctx.request, setup=setup)
+
+
+for export_format in ("ndjson", "csv"):
+    def bench_recipe_export(benchmark, ctx: BenchContext, export_format=export_format):
+        def export():
+            response = ctx.get(reverse("recipe:recipe-export"), {"export_format": export_format})
+            return b"".join(response.streaming_content)
+
+        benchmark.pedantic(export, rounds=SLOW_ROUNDS)
+
+    benchmark_case("recipes", f"recipe_export_{export_format}")(bench_recipe_export)
+
+
+for basename, model in (("tag", Tag), ("ingredient", Ingredient)):
+    group = f"{basename}s"
+
+    def bench_attr_list(benchmark, ctx: BenchContext, basename=basename):
+        benchmark.pedantic(ctx.get, args=(reverse(f"recipe:{basename}-list"),), setup=clear_response_cache)
+
+    def bench_attr_list_with_counts(benchmark, ctx: BenchContext, basename=basename):
+        benchmark.pedantic(ctx.get, args=(reverse(f"recipe:{basename}-list"), {"with_counts": 1}),
+                           setup=clear_response_cache)
+
+    def bench_attr_list_assigned_only(benchmark, ctx: BenchContext, basename=basename):
+        benchmark.pedantic(ctx.get, args=(reverse(f"recipe:{basename}-list"), {"assigned_only": 1}),
+                           setup=clear_response_cache)
+
+    def bench_attr_suggest(benchmark, ctx: BenchContext, basename=basename):
+        benchmark(ctx.get, reverse(f"recipe:{basename}-suggest"), {"q": WORDS[0][:3]})
+
+    def bench_attr_suggest_short(benchmark, ctx: BenchContext, basename=basename):
+        """A two letter prefix, matching the most names"""
+        benchmark(ctx.get, reverse(f"recipe:{basename}-suggest"), {"q": WORDS[0][:2]})
+
+    def bench_attr_suggest_typo(benchmark, ctx: BenchContext, basename=basename):
+        """A misspelled name, found by trigram similarity only"""
+        benchmark(ctx.get, reverse(f"recipe:{basename}-suggest"), {"q": WORDS[0].replace("o", "", 1)})
+
+    def bench_attr_update(benchmark, ctx: BenchContext, basename=basename, model=model):
+        item = model.objects.create(user=ctx.user, name=f"bench rename {next(_unique)}")
+        url = reverse(f"recipe:{basename}-detail", args=[item.id])
+        benchmark.pedantic(ctx.request, setup=lambda: (("patch", url, {"name": f"bench rename {next(_unique)}"}),
+                                                       {"format": "json"}))
+        item.delete()
+
+    def bench_attr_destroy(benchmark, ctx: BenchContext, basename=basename, model=model):
+        def setup():
+            item = model.objects.create(user=ctx.user, name=f"bench delete {next(_unique)}")
+            return ("delete", reverse(f"recipe:{basename}-detail", args=[item.id])), {"expected_status": 204}
+
+        benchmark.pedantic(ctx.request, setup=setup)
+
+    benchmark_case(group, f"{basename}_list")(bench_attr_list)
+    benchmark_case(group, f"{basename}_list_with_counts")(bench_attr_list_with_counts)
+    benchmark_case(group, f"{basename}_list_assigned_only")(bench_attr_list_assigned_only)
+    benchmark_case(group, f"{basename}_suggest")(bench_attr_suggest)
+    benchmark_case(group, f"{basename}_suggest_short")(bench_attr_suggest_short)
+    benchmark_case(group, f"{basename}_suggest_typo")(bench_attr_suggest_typo)
+    benchmark_case(group, f"{basename}_update")(bench_attr_update)
+    benchmark_case(group, f"{basename}_destroy")(bench_attr_destroy)
+
+
+@benchmark_case("users")
+def user_create(benchmark, ctx: BenchContext):
+    def setup():
+        return ("post", reverse("user:create"), {"email": f"bench-new-{next(_unique)}@example.org",
+                                                 "password": BENCH_PASSWORD, "name": "Bench"}), \
+               {"expected_status": 201}
+
+    def teardown(response):
+        User.objects.filter(email=response.data["email"]).delete()
+
+    benchmark.pedantic(ctx.request, setup=setup, teardown=teardown, rounds=SLOW_ROUNDS)
+
+
+@benchmark_case("users")
+def user_token(benchmark, ctx: BenchContext):
+    payload = {"email": ctx.user.email, "password": BENCH_PASSWORD}
+    benchmark.pedantic(ctx.request, args=("post", reverse("user:token"), payload), rounds=SLOW_ROUNDS)
+
+
+@benchmark_case("users")
+def user_me(benchmark, ctx: BenchContext):
+    benchmark(ctx.get, reverse("user:me"))
+
+
+@benchmark_case("users")
+def user_me_update(benchmark, ctx: BenchContext):
+    benchmark.pedantic(ctx.request, setup=lambda: (("patch", reverse("user:me"), {"name": f"Bench {next(_unique)}"}),
+                                                   {"format": "json"}))
+
+
+for conn_max_age in (0, 60):
+    def bench_connection(benchmark, ctx: BenchContext, conn_max_age=conn_max_age):
+        """Request latency when connections are closed after every request (0) or kept open"""
+        if connection.in_atomic_block:
+            # Closing the connection would abort the surrounding transaction, e.g. in tests
+            return
+        previous = connection.settings_dict["CONN_MAX_AGE"]
+        connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+        connection.close()
+
+        def handle():
+            # The test client skips the request_started/finished connection handling, so do it here
+            close_old_connections()
+            response = ctx.get(recipe_url(ctx.recipe_id))
+            close_old_connections()
+            return response
+
+        try:
+            benchmark(handle)
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = previous
+            connection.close()
+
+    benchmark_case("connections", f"conn_max_age_{conn_max_age}")(bench_connection)
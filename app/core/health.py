@@ -0,0 +1,91 @@
+"""
+Readiness probes of the database, migrations and media storage
+"""
+import functools
+import logging
+import tempfile
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+logger = logging.getLogger(__name__)
+
+READINESS_CACHE_KEY = "health:ready"
+
+
+def check_database():
+    """Run a trivial query, so a dropped persistent connection is noticed too"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+@functools.lru_cache(maxsize=None)
+def get_expected_migrations() -> frozenset:
+    """Return the (app, name) of every migration on disk, read once per process"""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    return frozenset(loader.graph.nodes)
+
+
+def check_migrations():
+    pending = get_expected_migrations() - set(MigrationRecorder(connection).applied_migrations())
+    if len(pending) != 0:
+        raise RuntimeError(f"{len(pending)} migrations are not applied")
+
+
+def check_media_root():
+    """Create and delete a file, which catches read-only mounts and full disks"""
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix=".health-"):
+        pass
+
+
+# Checks in order, later ones are skipped once the database is unreachable
+READINESS_CHECKS = {
+    "database": check_database,
+    "migrations": check_migrations,
+    "media_root": check_media_root,
+}
+
+
+def run_readiness_checks() -> dict:
+    """Return {"ready": bool, "checks": {name: {"ok": bool, ...}}} of every check"""
+    checks = {}
+    for name, check in READINESS_CHECKS.items():
+        if name == "migrations" and not checks["database"]["ok"]:
+            checks[name] = {"ok": False, "error": "skipped, the database is unreachable"}
+            continue
+        start = time.perf_counter()
+        try:
+            check()
+        except (DatabaseError, OSError, RuntimeError) as e:
+            logger.warning("Readiness check %s failed: %s", name, e)
+            # Driver and OS errors may name hosts or paths, only the log gets their text
+            checks[name] = {"ok": False, "error": str(e) if isinstance(e, RuntimeError) else type(e).__name__}
+        else:
+            checks[name] = {"ok": True}
+        checks[name]["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return {"ready": all(check["ok"] for check in checks.values()), "checks": checks}
+
+
+def get_readiness() -> dict:
+    """Return the readiness checks, cached for HEALTH_CHECK_CACHE_TTL so frequent probes stay cheap"""
+    cache = caches[settings.HEALTH_CHECK_CACHE]
+    result = cache.get(READINESS_CACHE_KEY)
+    if result is None:
+        result = run_readiness_checks()
+        cache.set(READINESS_CACHE_KEY, result, settings.HEALTH_CHECK_CACHE_TTL)
+    return result
+
+
+async def aget_readiness() -> dict:
+    """Async counterpart of get_readiness"""
+    cache = caches[settings.HEALTH_CHECK_CACHE]
+    result = await cache.aget(READINESS_CACHE_KEY)
+    if result is None:
+        result = await sync_to_async(run_readiness_checks)()
+        await cache.aset(READINESS_CACHE_KEY, result, settings.HEALTH_CHECK_CACHE_TTL)
+    return result
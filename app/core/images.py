@@ -0,0 +1,145 @@
+"""
+Background processing of uploaded recipe images
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.metrics import set_image_queue_depth
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of every generated variant
+IMAGE_VARIANTS = {"thumbnail": 150, "medium": 600, "large": 1200}
+IMAGE_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+IMAGE_QUALITY = 85
+
+_executor: ThreadPoolExecutor = None
+_lock = threading.Lock()
+_queue_depth = 0
+
+
+def get_queue_depth() -> int:
+    """Return the number of images submitted to this process and not yet processed"""
+    return _queue_depth
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                                           thread_name_prefix="recipe-image")
+        return _executor
+
+
+def enqueue_recipe_image(recipe_id: int):
+    """Process the recipe image once the current transaction commits"""
+    transaction.on_commit(lambda: _submit(recipe_id))
+
+
+def _submit(recipe_id: int):
+    global _queue_depth
+    if not settings.IMAGE_PROCESSING_ASYNC:
+        process_recipe_image(recipe_id)
+        return
+    with _lock:
+        _queue_depth += 1
+        set_image_queue_depth(_queue_depth)
+    _get_executor().submit(_run, recipe_id)
+
+
+def _run(recipe_id: int):
+    global _queue_depth
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception("Processing image of recipe %s crashed", recipe_id)
+    finally:
+        with _lock:
+            _queue_depth -= 1
+            set_image_queue_depth(_queue_depth)
+        # Worker threads open their own connection, do not leave it behind
+        connection.close()
+
+
+def _render_variants(source: Image.Image) -> dict[str, dict[str, bytes]]:
+    """Return encoded bytes of every variant, keyed by variant then format"""
+    image = ImageOps.exif_transpose(source).convert("RGB")
+    rendered = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size))
+        # Drop EXIF and any other metadata carried over from the upload
+        resized.info = {}
+        rendered[variant] = {}
+        for ext, image_format in IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format, quality=IMAGE_QUALITY)
+            rendered[variant][ext] = buffer.getvalue()
+    return rendered
+
+
+def _delete_variant_files(storage, variants: dict):
+    for files in variants.values():
+        for name in files.values():
+            storage.delete(name)
+
+
+def discard_image_variants(recipe: Recipe):
+    """Clear the variants of an image being replaced, deleting their files once the transaction commits
+
+    The variants are read from the locked row, as a processing run may have published newer ones since the
+    recipe was loaded, so call it inside the transaction saving the new image.
+    """
+    variants = (Recipe.objects.select_for_update().filter(pk=recipe.pk)
+                .values_list("image_variants", flat=True).first()) or {}
+    recipe.image_variants = {}
+    if len(variants) != 0:
+        storage = recipe.image.storage
+        transaction.on_commit(lambda: _delete_variant_files(storage, variants))
+
+
+def process_recipe_image(recipe_id: int) -> str:
+    """Generate the resized variants of a recipe image and return the resulting status"""
+    recipe = Recipe.objects.filter(pk=recipe_id).only("id", "image").first()
+    if recipe is None or not recipe.image:
+        return Recipe.ImageStatus.NONE
+
+    source_name = recipe.image.name
+    storage = recipe.image.storage
+    try:
+        with storage.open(source_name) as file, Image.open(file) as source:
+            rendered = _render_variants(source)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception("Could not process image %s of recipe %s", source_name, recipe_id)
+        Recipe.objects.filter(pk=recipe_id, image=source_name).update(
+            image_status=Recipe.ImageStatus.FAILED, updated_at=timezone.now())
+        return Recipe.ImageStatus.FAILED
+
+    stem = os.path.splitext(source_name)[0]
+    variants = {
+        variant: {ext: storage.save(f"{stem}_{variant}.{ext}", ContentFile(data)) for ext, data in files.items()}
+        for variant, files in rendered.items()
+    }
+    with transaction.atomic():
+        # Locked so runs on the same recipe publish one after the other, each replacing the variants it reads
+        replaced = (Recipe.objects.select_for_update().filter(pk=recipe_id, image=source_name)
+                    .values_list("image_variants", flat=True).first())
+        if replaced is None:
+            # The image was replaced while we were working on it
+            transaction.on_commit(lambda: _delete_variant_files(storage, variants))
+            return Recipe.ImageStatus.PENDING
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_status=Recipe.ImageStatus.READY, image_variants=variants, updated_at=timezone.now())
+        transaction.on_commit(lambda: _delete_variant_files(storage, replaced))
+    return Recipe.ImageStatus.READY
@@ -0,0 +1,98 @@
+"""
+Django command to benchmark the API against seeded users of growing size
+"""
+import json
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core.benchmark.harness import BenchmarkFixture, compare_reports, make_report
+from core.benchmark.seed import delete_bench_users, get_bench_user
+from core.benchmark.suite import BENCHMARKS, BenchContext, wait_for_image_queue
+
+
+def parse_sizes(value: str) -> list[int]:
+    try:
+        return [int(size) for size in value.split(",")]
+    except ValueError:
+        raise CommandError(f"--sizes takes comma separated integers, got {value!r}")
+
+
+class Command(BaseCommand):
+    """Run the benchmark suite and report latency, query count and allocations as JSON"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,1000,100000",
+                            help="Comma separated numbers of recipes owned by the benchmark users")
+        parser.add_argument("--rounds", type=int, default=10, help="Timed rounds per benchmark")
+        parser.add_argument("--warmup", type=int, default=1, help="Untimed rounds before timing")
+        parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose full name contains this")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Fail when slower than this JSON report")
+        parser.add_argument("--max-ratio", type=float, default=1.25,
+                            help="Largest accepted median latency ratio against --compare")
+        parser.add_argument("--seed-only", action="store_true", help="Seed the benchmark users and exit")
+        parser.add_argument("--flush", action="store_true", help="Delete the benchmark users and exit")
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            self.stdout.write(f"Deleted {delete_bench_users()} benchmark users")
+            return
+        sizes = parse_sizes(options["sizes"])
+        users = {}
+        for size in sizes:
+            start = time.perf_counter()
+            users[size] = get_bench_user(size)
+            self.stdout.write(f"Benchmark user with {size} recipes ready in {time.perf_counter() - start:.1f}s")
+        if options["seed_only"]:
+            return
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], MEDIA_ROOT=media_root):
+            benchmarks = self.run_benchmarks(users, options)
+            wait_for_image_queue()
+
+        report = make_report(benchmarks)
+        self.write_table(report)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                regressions = compare_reports(report, json.load(baseline), options["max_ratio"])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f"{regression['fullname']}: {regression['ratio']:.2f}x median latency, "
+                    f"{regression['baseline_queries']} -> {regression['queries']} queries"))
+            if len(regressions) != 0:
+                raise CommandError(f"{len(regressions)} benchmarks regressed against {options['compare']}")
+        self.stdout.write(self.style.SUCCESS("Benchmarks finished!"))
+
+    def run_benchmarks(self, users: dict, options: dict) -> list[BenchmarkFixture]:
+        benchmarks = []
+        for size, user in users.items():
+            ctx = BenchContext(user, size)
+            for group, name, func in BENCHMARKS:
+                benchmark = BenchmarkFixture(name, group, {"size": size}, options["rounds"], options["warmup"])
+                if options["filter"] not in benchmark.fullname:
+                    continue
+                func(benchmark, ctx)
+                if benchmark.stats is not None:
+                    benchmarks.append(benchmark)
+        return benchmarks
+
+    def write_table(self, report: dict):
+        """Write the median latency and query count of every benchmark per size, i.e. its scaling curve"""
+        sizes = sorted({benchmark["params"]["size"] for benchmark in report["benchmarks"]})
+        rows = {}
+        for benchmark in report["benchmarks"]:
+            cell = f"{benchmark['stats']['median'] * 1000:9.2f}ms {benchmark['extra_info']['queries']:4}q"
+            rows.setdefault(f"{benchmark['group']}.{benchmark['name']}", {})[benchmark["params"]["size"]] = cell
+        width = max((len(name) for name in rows), default=0)
+        self.stdout.write(" " * width + "".join(f"{size:>19}" for size in sizes))
+        for name, cells in rows.items():
+            self.stdout.write(name.ljust(width) + "".join(f"{cells.get(size, ''):>19}" for size in sizes))
@@ -0,0 +1,59 @@
+"""
+Django command to load a running server with many concurrent connections
+"""
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from core.benchmark.load import run_load
+from core.benchmark.seed import get_bench_user
+from core.models import Recipe
+
+
+def get_load_paths(recipe_id: int) -> list[str]:
+    """Return the read paths the load is spread over"""
+    return [
+        "/api/recipe/recipes/",
+        f"/api/recipe/recipes/{recipe_id}/",
+        "/api/recipe/tags/",
+        "/api/recipe/ingredients/",
+        "/health/live/",
+    ]
+
+
+class Command(BaseCommand):
+    """Report throughput and latency percentiles of a server under concurrent keep-alive load as JSON"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:9000", help="Base URL of the running server")
+        parser.add_argument("--connections", type=int, default=1000, help="Concurrent open connections")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+        parser.add_argument("--bench-size", type=int, default=1000,
+                            help="Recipes owned by the benchmark user whose token the requests use")
+        parser.add_argument("--label", default="", help="Name of the server setup in the report, e.g. wsgi")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        user = get_bench_user(options["bench_size"])
+        token, _ = Token.objects.get_or_create(user=user)
+        recipe_id = Recipe.objects.filter(user=user).values_list("id", flat=True).first()
+        paths = get_load_paths(recipe_id)
+
+        self.stdout.write(f"Loading {options['url']} with {options['connections']} connections "
+                          f"for {options['duration']}s...")
+        result = asyncio.run(run_load(options["url"], paths, options["connections"], options["duration"],
+                                      {"Authorization": f"Token {token.key}"}))
+        report = {"label": options["label"], "url": options["url"], "connections": options["connections"],
+                  "paths": paths, **result.as_dict()}
+
+        latency = report["latency"] or {}
+        self.stdout.write(
+            f"{report['requests']} requests, {report['throughput']:.1f} req/s, "
+            f"median {latency.get('median', 0) * 1000:.1f}ms, p95 {latency.get('p95', 0) * 1000:.1f}ms, "
+            f"p99 {latency.get('p99', 0) * 1000:.1f}ms, statuses {report['statuses']}, errors {report['errors']}")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,24 @@
+"""
+Django command to process recipe images still waiting for their variants
+"""
+from django.core.management.base import BaseCommand
+
+from core.images import process_recipe_image
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Process pending recipe images, e.g. ones lost by a restarted worker"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failed", action="store_true", help="Retry failed images as well")
+
+    def handle(self, *args, **options):
+        statuses = [Recipe.ImageStatus.PENDING]
+        if options["failed"]:
+            statuses.append(Recipe.ImageStatus.FAILED)
+        recipe_ids = Recipe.objects.filter(image_status__in=statuses).values_list("id", flat=True)
+        for recipe_id in recipe_ids.iterator():
+            status = process_recipe_image(recipe_id)
+            self.stdout.write(f"Recipe {recipe_id}: {status}")
+        self.stdout.write(self.style.SUCCESS("Images processed!"))
@@ -1,26 +1,62 @@
 """
 Django command to wait for db
 """
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.db.utils import OperationalError
+from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management.base import BaseCommand
+from core.health import check_migrations
 
-import time
 
-from psycopg2 import OperationalError as Psycopg2Error
+def get_backoff_delay(attempt: int, initial_delay: float, max_delay: float) -> float:
+    """Return the exponential delay before retry attempt, jittered to between half and all of it"""
+    delay = min(max_delay, initial_delay * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
 
 
 class Command(BaseCommand):
     """Django command to wait for db"""
 
+    # The system checks are slow and not needed to open a connection
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--timeout", type=float, default=60, help="Give up after this many seconds")
+        parser.add_argument("--initial-delay", type=float, default=0.1, help="Seconds before the first retry")
+        parser.add_argument("--max-delay", type=float, default=5, help="Longest seconds between retries")
+        parser.add_argument("--migrations", action="store_true",
+                            help="Also wait until every migration is applied, e.g. by another container")
+
     def handle(self, *args, **options):
         self.stdout.write("Waiting for db...")
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2Error, OperationalError):
-                self.stdout.write("Waiting 1 second...")
-                time.sleep(1)
+        deadline = time.monotonic() + options["timeout"]
+        self.retry(self.probe, deadline, options, "DB unavailable")
         self.stdout.write(self.style.SUCCESS("DB is available!"))
+        if options["migrations"]:
+            self.retry(check_migrations, deadline, options, "Migrations pending")
+            self.stdout.write(self.style.SUCCESS("Migrations are applied!"))
+
+    def probe(self):
+        """Open and close a raw driver connection, skipping Django's connection setup queries"""
+        connection = connections["default"]
+        connection.get_new_connection(connection.get_connection_params()).close()
+
+    def retry(self, attempt_func, deadline: float, options: dict, reason: str):
+        """Call attempt_func until it stops raising, sleeping with jittered exponential backoff"""
+        attempt = 0
+        while True:
+            try:
+                attempt_func()
+                return
+            except (Psycopg2Error, OperationalError, RuntimeError) as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(f"{reason} after {options['timeout']}s: {e}")
+                delay = min(remaining, get_backoff_delay(attempt, options["initial_delay"], options["max_delay"]))
+                self.stdout.write(f"{reason}, retrying in {delay:.2f}s...")
+                time.sleep(delay)
+                attempt += 1
@@ -0,0 +1,113 @@
+"""
+Prometheus metrics shared by every uWSGI worker
+
+When PROMETHEUS_MULTIPROC_DIR is set before the first import, prometheus_client
+keeps each process' values in memory mapped files in that directory and a scrape
+of any worker aggregates all of them. Otherwise the values live in this process.
+"""
+import atexit
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+
+NAMESPACE = "recipe_app"
+
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_DURATION = Histogram(
+    "request_duration_seconds", "Time spent handling a request", ["view", "action", "method", "status"],
+    namespace=NAMESPACE)
+REQUEST_QUERIES = Histogram(
+    "request_queries", "Database queries run by a request", ["view", "action"],
+    namespace=NAMESPACE, buckets=QUERY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Lookups of an in-process cache", ["cache", "result"], namespace=NAMESPACE)
+# livesum adds up the workers that are still running
+IMAGE_QUEUE_DEPTH = Gauge(
+    "image_queue_depth", "Images submitted and not yet processed", namespace=NAMESPACE,
+    multiprocess_mode="livesum")
+
+# Label of requests that did not resolve to a view, e.g. 404s
+UNRESOLVED_VIEW = "<unresolved>"
+
+
+def is_multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def _mark_process_dead():
+    if is_multiprocess():
+        mark_process_dead(os.getpid())
+
+
+# Drop the live gauges of a worker when uWSGI stops or recycles it
+atexit.register(_mark_process_dead)
+
+
+def get_view_labels(request) -> tuple[str, str]:
+    """Return the (view, action) labels of a request, e.g. ("recipe:recipe-list", "create")"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNRESOLVED_VIEW, request.method.lower()
+    # Viewsets map the method to an action, other views are labelled by the method
+    actions = getattr(match.func, "actions", None) or {}
+    return match.view_name, actions.get(request.method.lower(), request.method.lower())
+
+
+def observe_request(request, response, metrics):
+    """Record the measurements of a request taken by RequestMetricsMiddleware"""
+    view, action = get_view_labels(request)
+    REQUEST_DURATION.labels(view, action, request.method, response.status_code).observe(metrics.total_time)
+    REQUEST_QUERIES.labels(view, action).observe(metrics.queries.count)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def set_image_queue_depth(depth: int):
+    IMAGE_QUEUE_DEPTH.set(depth)
+
+
+def get_cache_hit_ratios(families) -> GaugeMetricFamily:
+    """Return the hit ratio of every cache computed from the aggregated lookup counters"""
+    lookups = {}
+    for family in families:
+        if family.name != f"{NAMESPACE}_cache_requests":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_total"):
+                counts = lookups.setdefault(sample.labels["cache"], {"hit": 0.0, "miss": 0.0})
+                counts[sample.labels["result"]] += sample.value
+    ratios = GaugeMetricFamily(f"{NAMESPACE}_cache_hit_ratio", "Share of cache lookups that were hits",
+                               labels=["cache"])
+    for cache, counts in sorted(lookups.items()):
+        total = counts["hit"] + counts["miss"]
+        ratios.add_metric([cache], counts["hit"] / total if total else 0.0)
+    return ratios
+
+
+class _Families:
+    """Collector returning already collected metric families"""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return the metrics of every worker in the Prometheus text format, with its content type"""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    families = list(registry.collect())
+    output = CollectorRegistry()
+    output.register(_Families([*families, get_cache_hit_ratios(families)]))
+    return generate_latest(output), CONTENT_TYPE_LATEST
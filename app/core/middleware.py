@@ -0,0 +1,234 @@
+"""
+Per-request query count, database time, serialization time, render time and
+response size, and the ASGI request concurrency limit
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+# Placeholder lists of any length, e.g. IN (%s, %s, %s), and inlined numbers share a fingerprint
+_PLACEHOLDER_LISTS = re.compile(r"%s(?:\s*,\s*%s)+")
+_NUMBERS = re.compile(r"\b\d+\b")
+
+# Query fingerprints included in a slow request log line
+SLOW_REQUEST_FINGERPRINTS = 5
+
+
+def normalize_sql(sql: str) -> str:
+    return _NUMBERS.sub("N", _PLACEHOLDER_LISTS.sub("%s, ...", sql))
+
+
+def get_fingerprint(sql: str) -> str:
+    """Return a short hash identifying the statement regardless of its parameters"""
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """Database execute wrapper counting and timing every statement"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            self.statements.append((sql, elapsed))
+
+    def get_fingerprints(self) -> list[tuple[str, int, float, str]]:
+        """Return (fingerprint, count, seconds, normalized sql) per distinct statement, slowest first"""
+        grouped = {}
+        for sql, elapsed in self.statements:
+            key = get_fingerprint(sql)
+            _, count, duration, normalized = grouped.get(key, (key, 0, 0.0, None))
+            grouped[key] = (key, count + 1, duration + elapsed, normalized or normalize_sql(sql))
+        return sorted(grouped.values(), key=lambda item: item[2], reverse=True)
+
+
+class RequestMetrics:
+    """Measurements of one sampled request, available as request.request_metrics"""
+
+    def __init__(self):
+        self.queries = QueryRecorder()
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.response_size = None
+        self.__serializing = False
+
+    @contextmanager
+    def measure_serialization(self):
+        """Add the time spent in the block to serialize_time
+
+        Queries run meanwhile, e.g. lazy relations, are left to the db time, and
+        blocks nested in one another are only counted once.
+        """
+        if self.__serializing:
+            yield
+            return
+        self.__serializing = True
+        start, db_start = time.perf_counter(), self.queries.duration
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start - (self.queries.duration - db_start)
+            self.serialize_time += max(elapsed, 0.0)
+            self.__serializing = False
+
+    @property
+    def app_time(self) -> float:
+        return max(self.total_time - self.queries.duration - self.serialize_time - self.render_time, 0.0)
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.queries.duration * 1000:.2f};desc="{self.queries.count} queries", '
+                f'serialize;dur={self.serialize_time * 1000:.2f}, '
+                f'render;dur={self.render_time * 1000:.2f}, '
+                f'app;dur={self.app_time * 1000:.2f}, '
+                f'total;dur={self.total_time * 1000:.2f}')
+
+
+@contextmanager
+def measure_serialization(request):
+    """Time the block as serialization of a measured request, do nothing for the others"""
+    metrics = getattr(request, "request_metrics", None)
+    if metrics is None:
+        yield
+        return
+    with metrics.measure_serialization():
+        yield
+
+
+class RequestMetricsMiddleware:
+    """Measure a sample of requests, add a Server-Timing header and log the slow ones
+
+    The header goes to every client with SERVER_TIMING_HEADER, else to staff users only.
+
+    The measurements also feed the Prometheus latency and query histograms served at /metrics/.
+
+    Queries are counted with a database execute wrapper, so DEBUG is not needed.
+    Serialization time covers the serializers' .data, see core.serializers.
+    Render time covers turning the response data into bytes, e.g. the JSON renderer.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        metrics = request.request_metrics = RequestMetrics()
+        start = time.perf_counter()
+        with self.wrap_connections(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+        metrics = request.request_metrics = RequestMetrics()
+        start = time.perf_counter()
+        # Connections belong to the thread running the request's sync code, so wrap them there
+        wrappers = await sync_to_async(self.wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.finish(request, response, metrics, start)
+
+    def wrap_connections(self, metrics: RequestMetrics) -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.queries))
+        return stack
+
+    def finish(self, request, response, metrics: RequestMetrics, start: float):
+        metrics.total_time = time.perf_counter() - start
+        if not response.streaming:
+            metrics.response_size = len(response.content)
+        observe_request(request, response, metrics)
+
+        if settings.SERVER_TIMING_HEADER or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = metrics.server_timing()
+        if metrics.total_time * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            self.log_slow_request(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, "request_metrics", None)
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(_):
+                metrics.render_time = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def log_slow_request(self, request, response, metrics: RequestMetrics):
+        fingerprints = metrics.queries.get_fingerprints()[:SLOW_REQUEST_FINGERPRINTS]
+        logger.warning(
+            "Slow request %s %s %s: %.1fms total, %d queries in %.1fms, serialize %.1fms, render %.1fms, "
+            "%s bytes%s",
+            request.method, request.path, response.status_code, metrics.total_time * 1000,
+            metrics.queries.count, metrics.queries.duration * 1000, metrics.serialize_time * 1000,
+            metrics.render_time * 1000,
+            metrics.response_size if metrics.response_size is not None else "streamed",
+            "".join(f"\n  {key} x{count} {duration * 1000:.1f}ms {sql[:200]}"
+                    for key, count, duration, sql in fingerprints),
+        )
+
+
+class ConcurrencyLimitMiddleware:
+    """Let at most ASGI_MAX_CONCURRENT_REQUESTS requests of an ASGI worker past this point at once
+
+    Django runs each request's sync code on a thread of its own under ASGI, every
+    thread with its own database connection, so without a limit a burst of
+    connections turns into as many threads and database connections. Waiting
+    requests only hold a coroutine. Under WSGI the worker count is the limit and
+    this middleware does nothing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.semaphore = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.semaphore is None:
+            # Created on first use so it belongs to the worker's event loop
+            self.semaphore = asyncio.Semaphore(settings.ASGI_MAX_CONCURRENT_REQUESTS)
+        async with self.semaphore:
+            return await self.get_response(request)
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, model_name: str, field_name: str):
+    """Fold every (user, name) duplicate into its oldest row, keeping recipe links"""
+    model = apps.get_model("core", model_name)
+    through = apps.get_model("core", "Recipe")._meta.get_field(field_name).remote_field.through
+    fk = f"{model_name.lower()}_id"
+
+    duplicates = (model.objects.values("user_id", "name")
+                  .annotate(keep_id=Min("id"), total=Count("id"))
+                  .filter(total__gt=1))
+    for row in duplicates:
+        keep_id = row["keep_id"]
+        dupe_ids = (model.objects.filter(user_id=row["user_id"], name=row["name"])
+                    .exclude(id=keep_id).values_list("id", flat=True))
+        for dupe_id in list(dupe_ids):
+            already_linked = through.objects.filter(**{fk: keep_id}).values("recipe_id")
+            (through.objects.filter(**{fk: dupe_id})
+             .exclude(recipe_id__in=already_linked)
+             .update(**{fk: keep_id}))
+        model.objects.filter(id__in=list(dupe_ids)).delete()
+
+
+def merge_duplicate_tags_ingredients(apps, _):
+    merge_duplicates(apps, "Tag", "tags")
+    merge_duplicates(apps, "Ingredient", "ingredients")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+def mark_existing_images_pending(apps, _):
+    """Queue images uploaded before variants existed for the process_images command"""
+    recipe = apps.get_model("core", "Recipe")
+    recipe.objects.exclude(image="").exclude(image__isnull=True).update(image_status="pending")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_name_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(mark_existing_images_pending, migrations.RunPython.noop),
+    ]
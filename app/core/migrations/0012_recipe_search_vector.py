@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:40
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+BACKFILL_SQL = """
+UPDATE core_recipe AS r SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, r.title), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce(
+        (SELECT string_agg(t.name, ' ') FROM core_tag t
+         JOIN core_recipe_tags rt ON rt.tag_id = t.id WHERE rt.recipe_id = r.id), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce(
+        (SELECT string_agg(i.name, ' ') FROM core_ingredient i
+         JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id WHERE ri.recipe_id = r.id), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, r.description), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """Add the GIN index and fill existing vectors, Postgres only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE INDEX recipe_search_vector_idx ON core_recipe USING gin (search_vector)")
+    schema_editor.execute(BACKFILL_SQL, {"config": settings.SEARCH_CONFIG})
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS recipe_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:05
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+TRIGRAM_INDEXES = {
+    "tag_name_trgm_idx": "core_tag",
+    "ingredient_name_trgm_idx": "core_ingredient",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Add GIN trigram indexes on the upper-cased names, Postgres only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX {name} ON {table} USING gin (UPPER(name) gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:10
+
+from django.contrib.postgres.operations import BtreeGinExtension
+from django.db import migrations
+
+# New index, replaced index and table of every suggestible model
+TRIGRAM_INDEXES = {
+    "tag_user_name_trgm_idx": ("tag_name_trgm_idx", "core_tag"),
+    "ingredient_user_name_trgm_idx": ("ingredient_name_trgm_idx", "core_ingredient"),
+}
+
+
+def create_user_trigram_indexes(apps, schema_editor):
+    """Lead the trigram indexes with user_id, so a short query only scans the user's names, Postgres only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, (old_name, table) in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX {name} ON {table} USING gin (user_id, UPPER(name) gin_trgm_ops)")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {old_name}")
+
+
+def drop_user_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, (old_name, table) in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX {old_name} ON {table} USING gin (UPPER(name) gin_trgm_ops)")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_range_indexes'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.RunPython(create_user_trigram_indexes, drop_user_trigram_indexes),
+    ]
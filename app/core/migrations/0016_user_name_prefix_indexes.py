@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:02
+
+from django.db import migrations
+
+# Index and table of every suggestible model
+PREFIX_INDEXES = {
+    "tag_user_name_prefix_idx": "core_tag",
+    "ingredient_user_name_prefix_idx": "core_ingredient",
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """Index UPPER(name) in byte order, so texts too short for trigrams read prefix ranges, Postgres only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table in PREFIX_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {name} ON {table} (user_id, (UPPER(name) COLLATE "C"))')
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_user_trigram_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
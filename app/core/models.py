@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 import uuid
@@ -48,6 +49,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class Recipe(models.Model):
     """Recipe object"""
+
+    class ImageStatus(models.TextChoices):
+        NONE = "none"
+        PENDING = "pending"
+        READY = "ready"
+        FAILED = "failed"
+
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
@@ -57,6 +65,18 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag", blank=True)
     ingredients = models.ManyToManyField("Ingredient", blank=True)
     image = models.ImageField(null=True, upload_to=get_recipe_image_file_path)
+    image_status = models.CharField(max_length=16, choices=ImageStatus.choices, default=ImageStatus.NONE)
+    image_variants = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by core.search, GIN-indexed on Postgres only
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-id"], name="recipe_user_id_idx"),
+            models.Index(fields=["user", "time_minutes", "id"], name="recipe_user_time_idx"),
+            models.Index(fields=["user", "price", "id"], name="recipe_user_price_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -65,6 +85,15 @@ class Recipe(models.Model):
 class Tag(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-name", "-id"], name="tag_user_name_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="tag_unique_user_name"),
+        ]
 
     def __str__(self):
         return self.name
@@ -74,6 +103,15 @@ class Ingredient(models.Model):
     """Ingredient object"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-name", "-id"], name="ingredient_user_name_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="ingredient_unique_user_name"),
+        ]
 
     def __str__(self):
         return self.name
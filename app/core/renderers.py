@@ -0,0 +1,33 @@
+"""
+JSON renderer encoding with orjson
+"""
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Dates and times go through JSONEncoder.default so they render exactly as with the stock renderer
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer producing the same compact UTF-8 output with orjson
+
+    Indented, ASCII-only or non-compact output is left to the stdlib encoder.
+    Unlike the stock renderer, NaN and infinite floats render as null instead of raising.
+    """
+    default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        # Keep the output a strict javascript subset, as JSONRenderer does
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
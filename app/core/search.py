@@ -0,0 +1,150 @@
+"""
+Full-text search over recipes
+
+On Postgres, Recipe.search_vector holds the weighted title (A), tag and
+ingredient names (B) and description (C). It is refreshed with one set-based
+UPDATE whenever one of those changes. Tag and ingredient suggestions use the
+pg_trgm similarity of their names. Other databases, e.g. SQLite in tests,
+fall back to case-insensitive substring matching.
+"""
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connections
+from django.db.models import (Case, Exists, F, FloatField, IntegerField, OuterRef, Q, QuerySet, Subquery, TextField,
+                              Value, When)
+from django.db.models.functions import Cast, Coalesce, Collate, Upper
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+
+# Shortest suggest text looked up by trigram
+TRIGRAM_LENGTH = 3
+
+
+def uses_postgres(using: str = "default") -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def _linked_names(model) -> Coalesce:
+    names = (model.objects.filter(recipe=OuterRef("pk")).order_by()
+             .values("recipe").annotate(names=StringAgg("name", " ")).values("names"))
+    return Coalesce(Subquery(names), Value(""), output_field=TextField())
+
+
+def refresh_search_vectors(recipe_ids):
+    """Recompute the search vector of the given recipes (ids or an id queryset) in one UPDATE"""
+    if not uses_postgres():
+        return
+    config = settings.SEARCH_CONFIG
+    Recipe.objects.filter(id__in=recipe_ids).update(search_vector=(
+        SearchVector("title", weight="A", config=config)
+        + SearchVector(_linked_names(Tag), weight="B", config=config)
+        + SearchVector(_linked_names(Ingredient), weight="B", config=config)
+        + SearchVector("description", weight="C", config=config)
+    ))
+
+
+def search_recipes(queryset: QuerySet, text: str) -> QuerySet:
+    """Filter recipes matching the search text and annotate them with a rank"""
+    if uses_postgres(queryset.db):
+        query = SearchQuery(text, search_type="websearch", config=settings.SEARCH_CONFIG)
+        # ts_rank returns a real, whose rounded text form would not compare equal to itself in keyset filters
+        rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(rank=rank)
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term)
+            | Q(description__icontains=term)
+            | Exists(Tag.objects.filter(recipe=OuterRef("pk"), name__icontains=term))
+            | Exists(Ingredient.objects.filter(recipe=OuterRef("pk"), name__icontains=term))
+        )
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def _annotate_name_match(queryset: QuerySet, text: str) -> QuerySet:
+    queryset = queryset.annotate(upper_name=Upper("name"))
+    is_prefix = Case(When(upper_name__startswith=text, then=Value(1)), default=Value(0), output_field=IntegerField())
+    if uses_postgres(queryset.db):
+        similarity = TrigramSimilarity("upper_name", text)
+    else:
+        similarity = Value(0.0, output_field=FloatField())
+    return queryset.annotate(is_prefix=is_prefix, similarity=similarity)
+
+
+def _name_key(queryset: QuerySet):
+    # Byte order, whatever the database collation, so prefix filters and ordering run on the name prefix index
+    return Collate(Upper("name"), "C") if uses_postgres(queryset.db) else Upper("name")
+
+
+def suggest_by_name(queryset: QuerySet, text: str, limit: int, recipe_count) -> QuerySet:
+    """Return the best limit tags/ingredients whose name contains or resembles the text, prefix matches first
+
+    Usage is only counted for the SUGGEST_CANDIDATES best matches by name, which are then ranked by prefix,
+    similarity and usage. So the count subquery runs a bounded number of times, and a much used item only
+    loses out if more than SUGGEST_CANDIDATES items tie with it on prefix and similarity.
+
+    Texts of at least TRIGRAM_LENGTH characters are matched on UPPER(name) by substring, longer ones by
+    similarity too, which Postgres answers from the (user_id, UPPER(name)) trigram index. A single trigram
+    hardly resembles a name without being part of it, while its similarity would be checked on every name
+    sharing one of its trigrams. Shorter texts have no trigram to look up, so they only match name prefixes,
+    and the candidates are the first ones by name.
+    """
+    text = text.upper()
+    window = max(limit, settings.SUGGEST_CANDIDATES)
+    if len(text) < TRIGRAM_LENGTH:
+        candidates = (queryset.annotate(name_key=_name_key(queryset))
+                      .filter(name_key__startswith=text).order_by("name_key")[:window])
+    else:
+        matches = queryset.annotate(upper_name=Upper("name"))
+        if uses_postgres(queryset.db) and len(text) > TRIGRAM_LENGTH:
+            matches = matches.filter(Q(upper_name__contains=text) | Q(upper_name__trigram_similar=text))
+        else:
+            matches = matches.filter(upper_name__contains=text)
+        candidates = _annotate_name_match(matches, text).order_by("-is_prefix", "-similarity", "name")[:window]
+    return (_annotate_name_match(queryset.model.objects.filter(pk__in=candidates.values("pk")), text)
+            .annotate(recipe_count=recipe_count)
+            .order_by("-is_prefix", "-similarity", "-recipe_count", "name")[:limit])
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_saved_recipe(sender, instance: Recipe, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "description"} & set(update_fields):
+        return
+    refresh_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_renamed_item(sender, instance, created: bool, **kwargs):
+    if not created:
+        refresh_search_vectors(instance.recipe_set.values("id"))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_item_recipes(sender, instance, **kwargs):
+    # The links are gone by post_delete, so keep the affected recipes now
+    instance._search_recipe_ids = list(instance.recipe_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_item(sender, instance, **kwargs):
+    refresh_search_vectors(getattr(instance, "_search_recipe_ids", []))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_linked_recipes(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_search_vectors([instance.pk])
+        return
+    if action == "pre_clear":
+        remember_item_recipes(sender, instance)
+    elif action == "post_clear":
+        refresh_search_vectors(instance._search_recipe_ids)
+    elif action in ("post_add", "post_remove"):
+        refresh_search_vectors(pk_set)
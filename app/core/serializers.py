@@ -0,0 +1,24 @@
+"""
+Serializer time of the measured requests, reported by core.middleware.RequestMetricsMiddleware
+"""
+from rest_framework.serializers import ListSerializer
+
+from core.middleware import measure_serialization
+
+
+class TimedDataMixin:
+    """Serializer mixin adding the time spent building .data to the request's serialization time
+
+    The request is read from the serializer context, which DRF views always pass.
+    With many=True the list serializer is the one timed, so set list_serializer_class
+    to TimedListSerializer or a subclass of it.
+    """
+
+    @property
+    def data(self):
+        with measure_serialization(self.context.get("request")):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, ListSerializer):
+    pass
@@ -0,0 +1,39 @@
+import threading
+
+from core.metrics import record_cache_lookup
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for an in-process cache
+
+    Lookups are also counted in the Prometheus metrics under name, which add up every worker.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+        record_cache_lookup(self.name, True)
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+        record_cache_lookup(self.name, False)
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio}
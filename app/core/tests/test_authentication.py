@@ -0,0 +1,58 @@
+"""
+Test the cached token authentication
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache_stats
+
+ME_URL = reverse("user:me")
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache_stats.reset()
+        self.user = get_user_model().objects.create_user("cached@example.com", "testpass123")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_second_request_skips_token_query(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        self.assertEqual(token_cache_stats.as_dict(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_changed_user_is_refreshed(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {"name": "Renamed"})
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data["name"], "Renamed")
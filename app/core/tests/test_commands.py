@@ -1,29 +1,166 @@
 """
 Test custom Django commands
 """
-
+import asyncio
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import MagicMock, patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core.benchmark.harness import compare_reports
+from core.benchmark.load import run_load
+from core.benchmark.seed import get_bench_user
+from core.models import Recipe
 
 
-@patch('core.management.commands.wait_for_db.Command.check')
+@patch('core.management.commands.wait_for_db.Command.probe')
 class CommandTests(SimpleTestCase):
 
-    def test_wait_for_db_ready(self, patched_check: MagicMock):
-        patched_check.return_value = True
-        call_command('wait_for_db')
+    def test_wait_for_db_ready(self, patched_probe: MagicMock):
         """Test waiting for db if db is available"""
-        patched_check.assert_called_once_with(databases=['default'])
+        call_command('wait_for_db', stdout=StringIO())
+        patched_probe.assert_called_once_with()
+
+    @patch('time.sleep')
+    def test_wait_for_db_delay(self, patched_sleep: MagicMock, patched_probe: MagicMock):
+        """Test retries back off exponentially up to the max delay"""
+        patched_probe.side_effect = [Psycopg2Error] * 2 + \
+                                    [OperationalError] * 5 + [None]
+        call_command('wait_for_db', '--initial-delay', '0.1', '--max-delay', '1', stdout=StringIO())
+        self.assertEqual(patched_probe.call_count, 8)
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        for attempt, delay in enumerate(delays):
+            ceiling = min(1, 0.1 * 2 ** attempt)
+            self.assertTrue(ceiling / 2 <= delay <= ceiling, (attempt, delay))
+
+    def test_wait_for_db_timeout(self, patched_probe: MagicMock):
+        patched_probe.side_effect = OperationalError("connection refused")
+
+        with self.assertRaisesMessage(CommandError, "DB unavailable after 0.0s: connection refused"):
+            call_command('wait_for_db', '--timeout', '0', stdout=StringIO())
+        patched_probe.assert_called_once_with()
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, _: MagicMock, patched_check: MagicMock):
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-                                    [OperationalError] * 3 + [True]
-        call_command('wait_for_db')
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+    @patch('core.management.commands.wait_for_db.check_migrations')
+    def test_wait_for_migrations(self, patched_migrations: MagicMock, _: MagicMock, patched_probe: MagicMock):
+        """Test migrations are only awaited when asked to"""
+        patched_migrations.side_effect = [RuntimeError("1 migrations are not applied"), None]
+
+        call_command('wait_for_db', stdout=StringIO())
+        patched_migrations.assert_not_called()
+
+        call_command('wait_for_db', '--migrations', stdout=StringIO())
+        self.assertEqual(patched_migrations.call_count, 2)
+
+
+class WaitForDbProbeTests(TestCase):
+
+    def test_probe_opens_raw_connection(self):
+        """Test the probe connects without running any query through Django"""
+        with self.assertNumQueries(0):
+            call_command('wait_for_db', stdout=StringIO())
+
+
+class ProcessImagesCommandTests(TestCase):
+
+    @patch('core.management.commands.process_images.process_recipe_image')
+    def test_process_pending_images(self, patched_process: MagicMock):
+        """Test only pending images are processed unless failed ones are requested"""
+        user = get_user_model().objects.create_user("command@example.com", "testpass123")
+        pending = Recipe.objects.create(user=user, title="Pending", time_minutes=1, price=1,
+                                        image_status=Recipe.ImageStatus.PENDING)
+        failed = Recipe.objects.create(user=user, title="Failed", time_minutes=1, price=1,
+                                       image_status=Recipe.ImageStatus.FAILED)
+        patched_process.return_value = Recipe.ImageStatus.READY
+
+        call_command('process_images', stdout=StringIO())
+        patched_process.assert_called_once_with(pending.id)
+
+        patched_process.reset_mock()
+        call_command('process_images', '--failed', stdout=StringIO())
+        self.assertEqual(sorted(c.args[0] for c in patched_process.call_args_list), [pending.id, failed.id])
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_benchmark_report(self):
+        """Test the report has stats, queries and allocations for every selected benchmark and size"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command('benchmark', '--sizes', '5,20', '--rounds', '2', '--warmup', '0', '-k', 'list',
+                         '--output', output, stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+
+        names = {benchmark["fullname"] for benchmark in report["benchmarks"]}
+        self.assertIn("recipes.recipe_list[size=5]", names)
+        self.assertIn("tags.tag_list_with_counts[size=20]", names)
+        for benchmark in report["benchmarks"]:
+            self.assertIn("list", benchmark["name"])
+            self.assertEqual(benchmark["stats"]["rounds"], 2)
+            self.assertGreater(benchmark["extra_info"]["alloc_peak_bytes"], 0)
+        self.assertEqual(Recipe.objects.filter(user=get_bench_user(20)).count(), 20)
+
+    def test_bench_user_reused(self):
+        """Test seeding is skipped when the benchmark user already has its recipes"""
+        user = get_bench_user(5)
+        self.assertEqual(get_bench_user(5).id, user.id)
+
+    def test_compare_reports(self):
+        """Test slower medians and extra queries are reported as regressions"""
+        def report(median: float, queries: int) -> dict:
+            return {"benchmarks": [{"fullname": "recipes.recipe_list[size=10]",
+                                    "stats": {"median": median}, "extra_info": {"queries": queries}}]}
+
+        self.assertEqual(compare_reports(report(0.011, 3), report(0.010, 3), 1.25), [])
+        self.assertEqual(len(compare_reports(report(0.020, 3), report(0.010, 3), 1.25)), 1)
+        self.assertEqual(len(compare_reports(report(0.010, 4), report(0.010, 3), 1.25)), 1)
+
+
+class LoadTests(SimpleTestCase):
+
+    def test_run_load(self):
+        """Test keep-alive requests are counted for plain and chunked bodies, and reconnect after a server close"""
+        requests = []
+
+        async def handle(reader, writer):
+            while True:
+                try:
+                    request = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                requests.append(request)
+                if b"/chunked/" in request:
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nok\r\n0\r\n\r\n")
+                elif b"/close/" in request:
+                    writer.close()
+                    return
+                else:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 2\r\n\r\nno")
+                await writer.drain()
+
+        async def load():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await run_load(f"http://127.0.0.1:{port}", ["/chunked/", "/missing/", "/close/"], 1, 0.3,
+                                      {"Authorization": "Token abc"})
+
+        report = asyncio.run(load()).as_dict()
+
+        self.assertGreater(report["statuses"]["200"], 0)
+        self.assertGreater(report["statuses"]["404"], 0)
+        self.assertGreater(report["reconnects"], 0)
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["requests"], report["statuses"]["200"] + report["statuses"]["404"])
+        self.assertIn("p99", report["latency"])
+        self.assertIn(b"Authorization: Token abc\r\n", requests[0])
@@ -1,19 +1,112 @@
 """
-Test for the health endpoint
+Test for the health endpoints
 """
+import asyncio
+import json
+import tempfile
+from unittest.mock import Mock, patch
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.health import READINESS_CACHE_KEY, get_expected_migrations
+from core.views import aget_readiness_view, get_health_views
+
+READY_URL = reverse("health-ready")
+
 
 class HealthCheckTest(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        caches[settings.HEALTH_CHECK_CACHE].delete(READINESS_CACHE_KEY)
 
     def test_health_check(self):
         url = reverse("health")
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_liveness(self):
+        """Test liveness does not depend on the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("health-live"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_ready(self):
+        res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["status"], "ok")
+        self.assertEqual(set(res.json()["checks"]), {"database", "migrations", "media_root"})
+        self.assertTrue(all(check["ok"] for check in res.json()["checks"].values()))
+
+    async def test_ready_coroutine_view(self):
+        """Test the coroutine served under ASGI runs the same checks"""
+        res = await aget_readiness_view(AsyncRequestFactory().get(READY_URL))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(res.content)["checks"]["database"]["ok"])
+
+    def test_ready_is_cached(self):
+        """Test repeated probes within the TTL do not query the database"""
+        self.client.get(READY_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(HEALTH_CHECK_CACHE_TTL=0)
+    def test_ready_pending_migrations(self):
+        expected = get_expected_migrations() | {("core", "9999_not_applied")}
+        with patch("core.health.get_expected_migrations", return_value=expected), \
+                self.assertLogs("core.health", "WARNING"):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.json()["checks"]["migrations"]["error"], "1 migrations are not applied")
+
+    def test_ready_database_unreachable(self):
+        """Test the migrations check is skipped and the error text is not exposed"""
+        unreachable = Mock(side_effect=OperationalError("host db is down"))
+        with patch.dict("core.health.READINESS_CHECKS", database=unreachable), \
+                self.assertLogs("core.health", "WARNING") as logs:
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.json()["checks"]["database"]["error"], "OperationalError")
+        self.assertFalse(res.json()["checks"]["migrations"]["ok"])
+        self.assertTrue(res.json()["checks"]["media_root"]["ok"])
+        self.assertIn("host db is down", logs.output[0])
+
+    def test_ready_media_root_not_writable(self):
+        with override_settings(MEDIA_ROOT=f"{self.media_root.name}/missing"), \
+                self.assertLogs("core.health", "WARNING"):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.json()["checks"]["media_root"]["ok"])
+
+
+class HealthViewSelectionTests(SimpleTestCase):
+
+    def test_views_follow_server_mode(self):
+        """Test coroutine views are only used for ASGI, so WSGI does not start an event loop per probe"""
+        for async_views in (False, True):
+            with self.subTest(async_views=async_views), override_settings(ASYNC_READ_VIEWS=async_views):
+                views = get_health_views()
+
+                self.assertEqual(set(views), {"health", "health-live", "health-ready"})
+                for view in views.values():
+                    self.assertEqual(asyncio.iscoroutinefunction(view), async_views)
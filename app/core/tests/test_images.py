@@ -0,0 +1,107 @@
+"""
+Test the recipe image processing
+"""
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from PIL import Image
+
+from core import images
+from core.images import IMAGE_VARIANTS, process_recipe_image
+from core.models import Recipe
+
+
+def create_image_file(size=(2000, 1000), exif=True) -> SimpleUploadedFile:
+    image = Image.new("RGB", size, color="red")
+    buffer = BytesIO()
+    image_exif = Image.Exif()
+    if exif:
+        image_exif[0x010F] = "Camera maker"
+    image.save(buffer, format="JPEG", exif=image_exif)
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+class ProcessRecipeImageTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user("images@example.com", "testpass123")
+        self.recipe = Recipe.objects.create(user=user, title="Pie", time_minutes=5, price=Decimal("1.00"))
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for files in self.recipe.image_variants.values():
+            for name in files.values():
+                self.recipe.image.storage.delete(name)
+        self.recipe.image.delete()
+
+    def test_variants_are_resized_without_exif(self):
+        self.recipe.image = create_image_file()
+        self.recipe.save()
+
+        status = process_recipe_image(self.recipe.id)
+
+        self.assertEqual(status, Recipe.ImageStatus.READY)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertEqual(set(self.recipe.image_variants), set(IMAGE_VARIANTS))
+        storage = self.recipe.image.storage
+        for variant, size in IMAGE_VARIANTS.items():
+            self.assertEqual(set(self.recipe.image_variants[variant]), {"webp", "jpeg"})
+            with storage.open(self.recipe.image_variants[variant]["jpeg"]) as file, Image.open(file) as image:
+                self.assertEqual(max(image.size), size)
+                self.assertEqual(len(image.getexif()), 0)
+
+    def test_reprocessing_replaces_old_variants(self):
+        self.recipe.image = create_image_file()
+        self.recipe.save()
+        process_recipe_image(self.recipe.id)
+        self.recipe.refresh_from_db()
+        old_thumbnail = self.recipe.image_variants["thumbnail"]["webp"]
+
+        self.recipe.image.delete(save=False)
+        self.recipe.image = create_image_file(exif=False)
+        self.recipe.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_recipe_image(self.recipe.id)
+
+        self.assertFalse(self.recipe.image.storage.exists(old_thumbnail))
+
+    def test_concurrent_runs_leave_no_orphaned_variants(self):
+        """Test a run publishing after another one deletes the variants that run published meanwhile"""
+        self.recipe.image = create_image_file()
+        self.recipe.save()
+        render_variants = images._render_variants
+        other_run = {}
+
+        def render_while_other_run_publishes(source):
+            if "variants" not in other_run:
+                other_run["variants"] = {}
+                process_recipe_image(self.recipe.id)
+                other_run["variants"] = Recipe.objects.get(pk=self.recipe.pk).image_variants
+            return render_variants(source)
+
+        with patch("core.images._render_variants", render_while_other_run_publishes), \
+                self.captureOnCommitCallbacks(execute=True):
+            process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        for variant, files in other_run["variants"].items():
+            for ext, name in files.items():
+                self.assertFalse(storage.exists(name))
+                self.assertTrue(storage.exists(self.recipe.image_variants[variant][ext]))
+
+    def test_broken_image_is_marked_failed(self):
+        self.recipe.image = SimpleUploadedFile("broken.jpg", b"not an image")
+        self.recipe.save()
+
+        with self.assertLogs("core.images", level="ERROR"):
+            status = process_recipe_image(self.recipe.id)
+
+        self.assertEqual(status, Recipe.ImageStatus.FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.FAILED)
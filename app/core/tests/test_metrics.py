@@ -0,0 +1,94 @@
+"""
+Test the Prometheus metrics endpoint
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core.metrics import render_metrics
+
+METRICS_URL = reverse("metrics")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def get_sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(f"recipe_app_{name}", labels) or 0.0
+
+
+class MetricsViewTests(TestCase):
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        self.user = get_user_model().objects.create_user("metrics@example.com", "testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_request_histograms(self):
+        """Test requests are observed per view and action"""
+        labels = {"view": "recipe:tag-list", "action": "list"}
+        before = get_sample("request_duration_seconds_count", method="GET", status="200", **labels)
+        queries_before = get_sample("request_queries_sum", **labels)
+
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(get_sample("request_duration_seconds_count", method="GET", status="200", **labels),
+                         before + 1)
+        self.assertEqual(get_sample("request_queries_sum", **labels), queries_before + 1)
+
+    def test_cache_and_queue_metrics(self):
+        """Test the scrape includes the cache lookups, their hit ratio and the image queue depth"""
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        body = res.content.decode()
+        self.assertIn('recipe_app_cache_requests_total{cache="response",result="hit"}', body)
+        self.assertRegex(body, r'recipe_app_cache_hit_ratio\{cache="response"\} (0|1)\.\d+')
+        self.assertIn("recipe_app_image_queue_depth ", body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_token(self):
+        """Test a configured token is required to scrape"""
+        client = APIClient()
+        self.assertEqual(client.get(METRICS_URL).status_code, 401)
+        self.assertEqual(client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(res.status_code, 200)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+
+    def test_workers_are_aggregated(self):
+        """Test a scrape adds up the lookups recorded by separate worker processes"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory}
+            for hits, misses in ((3, 1), (5, 3)):
+                subprocess.run(
+                    [sys.executable, "-c",
+                     "from core.metrics import record_cache_lookup, set_image_queue_depth\n"
+                     f"for _ in range({hits}): record_cache_lookup('token', True)\n"
+                     f"for _ in range({misses}): record_cache_lookup('token', False)\n"
+                     "set_image_queue_depth(2)\n"],
+                    env=env, cwd=settings.BASE_DIR, check=True)
+
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+                body = render_metrics()[0].decode()
+
+        self.assertIn('recipe_app_cache_requests_total{cache="token",result="hit"} 8.0', body)
+        self.assertIn('recipe_app_cache_requests_total{cache="token",result="miss"} 4.0', body)
+        self.assertIn('recipe_app_cache_hit_ratio{cache="token"} 0.6666666666666666', body)
+        # Both workers exited, so their queue depths no longer count
+        self.assertNotIn("recipe_app_image_queue_depth ", body)
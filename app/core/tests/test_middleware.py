@@ -0,0 +1,144 @@
+"""
+Test the request metrics and concurrency limit middleware
+"""
+import asyncio
+import re
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.middleware import ConcurrencyLimitMiddleware, RequestMetrics, get_fingerprint
+from core.models import Tag
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        self.user = get_user_model().objects.create_user("metrics@example.com", "testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        """Test the header reports the queries the request ran"""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {"with_counts": 1})
+
+        timing = res["Server-Timing"]
+        self.assertIn('desc="1 queries"', timing)
+        for metric in ("db", "serialize", "render", "app", "total"):
+            self.assertRegex(timing, rf"\b{metric};dur=\d+\.\d\d")
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_server_timing_header_staff_only(self):
+        """Test the timings are kept from other clients unless enabled"""
+        res = self.client.get(TAGS_URL)
+        self.assertNotIn("Server-Timing", res)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+        self.assertIn("Server-Timing", res)
+
+    @override_settings(SERVER_TIMING_HEADER=True, REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn("Server-Timing", res)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0, SERVER_TIMING_HEADER=False)
+    def test_slow_request_logged(self):
+        """Test slow requests are logged with their query fingerprints and response size"""
+        with self.assertLogs("core.middleware", level="WARNING") as logs:
+            res = self.client.get(TAGS_URL, {"with_counts": 1})
+
+        self.assertNotIn("Server-Timing", res)
+        message = logs.output[0]
+        self.assertIn(f"GET {TAGS_URL} 200", message)
+        self.assertIn(f"{len(res.content)} bytes", message)
+        self.assertRegex(message, r", serialize [\d.]+ms, ")
+        self.assertRegex(message, r"\n  [0-9a-f]{12} x1 [\d.]+ms SELECT")
+
+    def test_serializer_time_measured(self):
+        """Test the time spent in the serializer is reported apart from the other app time"""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        def slow_representation(serializer, instance):
+            time.sleep(0.05)
+            return {"id": instance.id, "name": instance.name}
+
+        with patch("recipe.serializers.TagSerializer.to_representation", slow_representation), \
+                override_settings(SERVER_TIMING_HEADER=True):
+            res = self.client.get(TAGS_URL)
+
+        serialize = float(re.search(r"\bserialize;dur=([\d.]+)", res["Server-Timing"]).group(1))
+        app = float(re.search(r"\bapp;dur=([\d.]+)", res["Server-Timing"]).group(1))
+        self.assertGreaterEqual(serialize, 50)
+        self.assertLess(app, serialize)
+
+
+class RequestMetricsTests(SimpleTestCase):
+
+    def test_measure_serialization(self):
+        """Test nested blocks are counted once and queries run inside are left to the db time"""
+        metrics = RequestMetrics()
+
+        with metrics.measure_serialization():
+            with metrics.measure_serialization():
+                time.sleep(0.02)
+            metrics.queries.duration += 0.01
+            time.sleep(0.01)
+
+        self.assertGreaterEqual(metrics.serialize_time, 0.02)
+        self.assertLess(metrics.serialize_time, 0.03 + 0.01)
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_parameters_ignored(self):
+        """Test statements differing only in parameters share a fingerprint"""
+        self.assertEqual(get_fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 21'),
+                         get_fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 50'))
+        self.assertNotEqual(get_fingerprint('SELECT * FROM "t"'), get_fingerprint('SELECT * FROM "u"'))
+        self.assertTrue(re.fullmatch(r"[0-9a-f]{12}", get_fingerprint("SELECT 1")))
+
+
+class ConcurrencyLimitMiddlewareTests(SimpleTestCase):
+
+    @override_settings(ASGI_MAX_CONCURRENT_REQUESTS=2)
+    async def test_limit(self):
+        """Test requests past the limit wait for a running one to finish"""
+        running = []
+        peak = 0
+
+        async def get_response(request):
+            nonlocal peak
+            running.append(request)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.remove(request)
+            return request
+
+        middleware = ConcurrencyLimitMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        responses = await asyncio.gather(*(middleware(index) for index in range(5)))
+
+        self.assertEqual(responses, list(range(5)))
+        self.assertEqual(peak, 2)
+
+    def test_sync_passthrough(self):
+        middleware = ConcurrencyLimitMiddleware(lambda request: request)
+
+        self.assertFalse(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(middleware("request"), "request")
@@ -1,4 +1,5 @@
 from decimal import Decimal
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
@@ -86,6 +87,19 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_per_user(self):
+        user = create_user()
+        models.Tag.objects.create(user=user, name="Vegan")
+        models.Tag.objects.create(user=create_user(email="other@example.com"), name="Vegan")
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Vegan")
+
+    def test_ingredient_name_unique_per_user(self):
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name="Salt")
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name="Salt")
+
     @patch("core.models.uuid.uuid4")
     def test_recipe_filename_uuid(self, mock_uuid):
         uuid = "test-uuid"
@@ -0,0 +1,44 @@
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test ORJSONRenderer output matches JSONRenderer"""
+
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(ORJSONRenderer().render(data, accepted_media_type),
+                         JSONRenderer().render(data, accepted_media_type))
+
+    def test_native_types(self):
+        self.assertSameOutput({"results": [{"id": 1, "title": "Crème brûlée", "price": "4.50", "link": "",
+                                            "ok": True, "none": None, "ratio": 0.25}], "next": None})
+
+    def test_line_separators_escaped(self):
+        self.assertSameOutput({"title": "a\u2028b\u2029c"})
+
+    def test_python_types(self):
+        self.assertSameOutput({
+            "decimal": Decimal("4.50"),
+            "datetime": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            "offset": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2))),
+            "date": date(2024, 1, 2),
+            "time": time(3, 4, 5),
+            "duration": timedelta(minutes=90),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": gettext_lazy("Not found."),
+            "error": [ErrorDetail("This field is required.", code="required")],
+            "tuple": (1, 2),
+            1: "int key",
+        })
+
+    def test_empty_and_indented(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertSameOutput({"a": [1, {"b": 2}]}, "application/json; indent=4")
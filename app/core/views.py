@@ -1,7 +1,78 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from functools import wraps
 
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 
-@api_view(["GET"])
+from core.health import aget_readiness, get_readiness
+from core.metrics import render_metrics
+
+
+def require_get(view):
+    """require_GET for coroutine views, which Django 4.2's decorators do not support"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def readiness_response(readiness: dict) -> JsonResponse:
+    return JsonResponse({"status": "ok" if readiness["ready"] else "unavailable", "checks": readiness["checks"]},
+                        status=200 if readiness["ready"] else 503)
+
+
+@require_GET
 def get_health_check_view(_):
-    return Response(status=200)
+    return HttpResponse(status=200)
+
+
+@require_GET
+def get_liveness_view(_):
+    """The process serves requests, nothing else is checked so a database outage does not restart it"""
+    return JsonResponse({"status": "ok"})
+
+
+@require_GET
+def get_readiness_view(_):
+    """Whether this instance should receive traffic, 503 while any dependency is unavailable"""
+    return readiness_response(get_readiness())
+
+
+@require_get
+async def aget_health_check_view(_):
+    return HttpResponse(status=200)
+
+
+@require_get
+async def aget_liveness_view(_):
+    return JsonResponse({"status": "ok"})
+
+
+@require_get
+async def aget_readiness_view(_):
+    return readiness_response(await aget_readiness())
+
+
+def get_health_views() -> dict:
+    """Return the health views by URL name
+
+    Coroutines with ASYNC_READ_VIEWS, so probes never wait for a request thread under ASGI. Functions
+    otherwise, as WSGI would run every coroutine view in an event loop of its own.
+    """
+    if settings.ASYNC_READ_VIEWS:
+        views = (aget_health_check_view, aget_liveness_view, aget_readiness_view)
+    else:
+        views = (get_health_check_view, get_liveness_view, get_readiness_view)
+    return dict(zip(("health", "health-live", "health-ready"), views))
+
+
+def get_metrics_view(request):
+    """Prometheus scrape endpoint, a plain Django view since Prometheus sends its own Accept header"""
+    if settings.METRICS_TOKEN and not constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponse(status=401)
+    output, content_type = render_metrics()
+    return HttpResponse(output, content_type=content_type)
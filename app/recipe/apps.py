@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from recipe import cache, conditional
+        cache.connect_signals()
+        conditional.connect_signals()
@@ -0,0 +1,98 @@
+"""
+Set-based writes behind the bulk recipe endpoint
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag, User
+from core.search import refresh_search_vectors
+from recipe.cache import batch_invalidation, invalidate_user
+from recipe.serializers import get_or_create_by_name
+
+# Recipes written per transaction
+BULK_BATCH_SIZE = 500
+
+RELATIONS = (
+    ("tags", Tag, "tag_id"),
+    ("ingredients", Ingredient, "ingredient_id"),
+)
+
+
+def _split_relations(data: dict) -> tuple[dict, dict]:
+    """Split validated data into plain fields and the relations that were sent"""
+    relation_names = [name for name, _, _ in RELATIONS]
+    fields = {key: value for key, value in data.items() if key not in relation_names}
+    relations = {key: value for key, value in data.items() if key in relation_names}
+    return fields, relations
+
+
+def _set_links(user: User, recipes: list[Recipe], relations: list[dict], replace: bool):
+    """Link every recipe to the named tags/ingredients with one query per table"""
+    for name, model, column in RELATIONS:
+        through = getattr(Recipe, name).through
+        wanted_names = {recipe.id: [item["name"] for item in rel[name]]
+                        for recipe, rel in zip(recipes, relations) if name in rel}
+        if len(wanted_names) == 0:
+            continue
+        found = get_or_create_by_name(model, user, (n for names in wanted_names.values() for n in names))
+        wanted = {(recipe_id, found[n].id) for recipe_id, names in wanted_names.items() for n in names}
+        if replace:
+            current = {(recipe_id, linked_id): link_id for link_id, recipe_id, linked_id in
+                       through.objects.filter(recipe_id__in=wanted_names).values_list("id", "recipe_id", column)}
+            stale = [link_id for pair, link_id in current.items() if pair not in wanted]
+            if len(stale) != 0:
+                through.objects.filter(id__in=stale).delete()
+            wanted -= current.keys()
+        through.objects.bulk_create([through(recipe_id=recipe_id, **{column: linked_id})
+                                     for recipe_id, linked_id in wanted], ignore_conflicts=True)
+
+
+def bulk_create_recipes(user: User, items: list[dict]) -> list[Recipe]:
+    """Insert recipes with their tags and ingredients, one transaction per batch"""
+    created = []
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        split = [_split_relations(data) for data in items[start:start + BULK_BATCH_SIZE]]
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create([Recipe(user=user, **fields) for fields, _ in split])
+            _set_links(user, recipes, [relations for _, relations in split], replace=False)
+            refresh_search_vectors([recipe.id for recipe in recipes])
+        created.extend(recipes)
+    invalidate_user(user.id)
+    return created
+
+
+def bulk_update_recipes(user: User, items: list[tuple[int, dict]]) -> set[int]:
+    """Partially update the user's recipes by id and return the ids that were found"""
+    updated = set()
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        batch = items[start:start + BULK_BATCH_SIZE]
+        with transaction.atomic():
+            recipes = Recipe.objects.filter(user=user).select_for_update().in_bulk([pk for pk, _ in batch])
+            changed_fields = {"updated_at"}
+            linked, relations = [], []
+            now = timezone.now()
+            for pk, data in batch:
+                if pk not in recipes:
+                    continue
+                recipe = recipes[pk]
+                fields, rel = _split_relations(data)
+                for key, value in fields.items():
+                    setattr(recipe, key, value)
+                recipe.updated_at = now
+                changed_fields.update(fields)
+                linked.append(recipe)
+                relations.append(rel)
+            Recipe.objects.bulk_update(recipes.values(), sorted(changed_fields))
+            _set_links(user, linked, relations, replace=True)
+            refresh_search_vectors([recipe.id for recipe in linked])
+        updated.update(recipes)
+    invalidate_user(user.id)
+    return updated
+
+
+def bulk_delete_recipes(user: User, ids: list[int]) -> set[int]:
+    """Delete the user's recipes by id and return the ids that were found"""
+    with transaction.atomic(), batch_invalidation(user.id):
+        found = set(Recipe.objects.filter(user=user, id__in=ids).values_list("id", flat=True))
+        Recipe.objects.filter(id__in=found).delete()
+    return found
@@ -0,0 +1,157 @@
+"""
+Per-user versioned cache for the recipe, tag and ingredient list responses
+
+Every cache key embeds a per-user generation counter. Any write to the user's
+recipes, tags, ingredients or their links bumps the counter, which orphans all
+of the user's cached lists at once instead of searching for their keys.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from rest_framework.response import Response
+
+from core.models import Ingredient, Recipe, Tag
+from core.stats import CacheStats
+from recipe.conditional import get_not_modified_response, make_etag, set_validators
+
+response_cache_stats = CacheStats("response")
+
+# Set while batch_invalidation() collects the row signals of a bulk write
+_invalidation_batched = ContextVar("invalidation_batched", default=False)
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE]
+
+
+def get_generation_key(user_id: int) -> str:
+    return f"recipe:generation:{user_id}"
+
+
+def get_generation(user_id: int) -> int:
+    """Return the user's current cache generation"""
+    cache = get_response_cache()
+    key = get_generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock so an evicted counter never reuses an old generation
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(user_id: int) -> int:
+    cache = get_response_cache()
+    key = get_generation_key(user_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, time.time_ns(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(user_id: int):
+    """Invalidate every cached list of the user"""
+    cache = get_response_cache()
+    try:
+        cache.incr(get_generation_key(user_id))
+    except ValueError:
+        cache.add(get_generation_key(user_id), time.time_ns(), None)
+
+
+def get_response_cache_key(request, endpoint: str, generation: int = None) -> str:
+    """Return the cache key for (user, endpoint, normalized query params)"""
+    if generation is None:
+        generation = get_generation(request.user.pk)
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    digest = hashlib.sha256(repr((request.get_host(), params)).encode()).hexdigest()
+    return f"recipe:response:{request.user.pk}:{generation}:{endpoint}:{digest}"
+
+
+class CachedListMixin:
+    """Serve list responses from the per-user versioned cache, answering If-None-Match with 304"""
+
+    def list(self, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = get_response_cache_key(request, self.basename)
+        # The key changes with every write of the user, so it is also a strong validator
+        etag = make_etag(key, request.accepted_renderer.format)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        data = cache.get(key)
+        if data is not None:
+            response_cache_stats.record_hit()
+            return Response(data, headers={"X-Cache": "HIT", "ETag": etag})
+        response_cache_stats.record_miss()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+            set_validators(response, etag)
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        """Async counterpart of list, see core.async_views.AsyncReadViewSetMixin"""
+        cache = get_response_cache()
+        key = get_response_cache_key(request, self.basename, await aget_generation(request.user.pk))
+        etag = make_etag(key, request.accepted_renderer.format)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        data = await cache.aget(key)
+        if data is not None:
+            response_cache_stats.record_hit()
+            return Response(data, headers={"X-Cache": "HIT", "ETag": etag})
+        response_cache_stats.record_miss()
+        response = await super().alist(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data, settings.RESPONSE_CACHE_TTL)
+            set_validators(response, etag)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+def invalidate_user(user_id: int):
+    if _invalidation_batched.get():
+        return
+    # Bump now so the writing request sees its own change, and again after commit
+    # so a concurrent read of the old rows cannot stay cached under the new generation
+    bump_generation(user_id)
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+@contextmanager
+def batch_invalidation(user_id: int):
+    """Invalidate the user's lists once after the block, instead of once per row signal sent within it"""
+    token = _invalidation_batched.set(True)
+    try:
+        yield
+    finally:
+        _invalidation_batched.reset(token)
+    invalidate_user(user_id)
+
+
+def invalidate_owner(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+def invalidate_links(sender, instance, action: str, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_user(instance.user_id)
+
+
+def connect_signals():
+    for model in (Recipe, Tag, Ingredient):
+        post_save.connect(invalidate_owner, sender=model, dispatch_uid=f"response_cache_save_{model.__name__}")
+        post_delete.connect(invalidate_owner, sender=model, dispatch_uid=f"response_cache_delete_{model.__name__}")
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(invalidate_links, sender=through, dispatch_uid=f"response_cache_links_{through.__name__}")
@@ -0,0 +1,111 @@
+"""
+Validators for conditional requests on recipe resources
+"""
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from django.db.models import CharField, Value
+from django.db.models.signals import m2m_changed, pre_delete
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from core.models import Ingredient, Recipe, Tag
+
+
+def make_etag(*parts) -> str:
+    """Return a strong ETag for the given representation parts"""
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest())
+
+
+def get_recipe_validator_rows(request, recipe_id):
+    """Return the (kind, id, updated_at) rows of a recipe and its linked items, None for a malformed id"""
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return None
+    # One round-trip for the recipe timestamp plus the id and timestamp of every linked item
+    recipe = (Recipe.objects.filter(pk=recipe_id, user=request.user)
+              .annotate(kind=Value("recipe", output_field=CharField()))
+              .values_list("kind", "id", "updated_at"))
+    tags = (Recipe.tags.through.objects.filter(recipe_id=recipe_id, recipe__user=request.user)
+            .annotate(kind=Value("tag", output_field=CharField()))
+            .values_list("kind", "tag_id", "tag__updated_at"))
+    ingredients = (Recipe.ingredients.through.objects.filter(recipe_id=recipe_id, recipe__user=request.user)
+                   .annotate(kind=Value("ingredient", output_field=CharField()))
+                   .values_list("kind", "ingredient_id", "ingredient__updated_at"))
+    return recipe.union(tags, ingredients, all=True)
+
+
+def lock_recipe(request, recipe_id):
+    """Lock the recipe row until the end of the transaction, so its validators hold until the write"""
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return
+    list(Recipe.objects.select_for_update().filter(pk=recipe_id, user=request.user).values_list("pk"))
+
+
+def make_recipe_validators(request, rows) -> Optional[tuple[str, datetime]]:
+    rows = sorted(rows)
+    if not any(kind == "recipe" for kind, _, _ in rows):
+        return None
+    last_modified = max(updated_at for _, _, updated_at in rows)
+    sparse_fieldset = request.query_params.get("fields"), request.query_params.get("expand")
+    etag = make_etag(request.get_host(), request.accepted_renderer.format, sparse_fieldset, rows)
+    return etag, last_modified
+
+
+def get_recipe_validators(request, recipe_id) -> Optional[tuple[str, datetime]]:
+    """Return the (ETag, Last-Modified) of a recipe detail without serializing it"""
+    rows = get_recipe_validator_rows(request, recipe_id)
+    return make_recipe_validators(request, rows) if rows is not None else None
+
+
+async def aget_recipe_validators(request, recipe_id) -> Optional[tuple[str, datetime]]:
+    rows = get_recipe_validator_rows(request, recipe_id)
+    return make_recipe_validators(request, [row async for row in rows]) if rows is not None else None
+
+
+def get_not_modified_response(request, etag: str, last_modified: datetime = None):
+    """Return a 304/412 response if the request preconditions say so, else None"""
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag: str, last_modified: datetime = None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+
+
+def touch_recipes(recipe_ids):
+    """Move the Last-Modified of the recipes forward, for link changes that do not save the recipe row"""
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def touch_item_recipes(sender, instance, **kwargs):
+    # Runs before the delete, while the links are still there
+    touch_recipes(instance.recipe_set.values("id"))
+
+
+def touch_relinked_recipes(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    if not reverse:
+        if action == "post_clear" or (action in ("post_add", "post_remove") and pk_set):
+            touch_recipes([instance.pk])
+    elif action == "pre_clear":
+        touch_item_recipes(sender, instance)
+    elif action in ("post_add", "post_remove") and pk_set:
+        touch_recipes(pk_set)
+
+
+def connect_signals():
+    for model in (Tag, Ingredient):
+        pre_delete.connect(touch_item_recipes, sender=model, dispatch_uid=f"validators_delete_{model.__name__}")
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(touch_relinked_recipes, sender=through,
+                            dispatch_uid=f"validators_links_{through.__name__}")
@@ -0,0 +1,82 @@
+"""
+Streaming export of a user's recipes as NDJSON or CSV
+"""
+import csv
+import json
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.utils.encoders import JSONEncoder
+
+from recipe.pagination import get_keyset_filter, get_position
+from recipe.serializers import RecipeDetailSerializer
+
+# Recipes fetched, prefetched and serialized together
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = ("id", "title", "time_minutes", "price", "link", "description", "image", "tags", "ingredients",)
+
+
+def iter_recipe_chunks(queryset: QuerySet, chunk_size: int = None) -> Iterator[list]:
+    """Yield the queryset in chunks with tags and ingredients prefetched per chunk"""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    if not connections[queryset.db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        recipes = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(recipes, chunk_size)):
+            yield chunk
+        return
+    # Without server-side cursors the driver would buffer everything, so page on the ordering instead
+    ordering = tuple(queryset.query.order_by) or ("-id",)
+    if ordering[-1].removeprefix("-") not in ("id", "pk"):
+        ordering = (*ordering, "-id")
+    queryset = queryset.order_by(*ordering)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        chunk = list(queryset.filter(get_keyset_filter(ordering, get_position(chunk[-1], ordering)))[:chunk_size])
+
+
+def iter_serialized(queryset: QuerySet, context: dict) -> Iterator[dict]:
+    for chunk in iter_recipe_chunks(queryset):
+        yield from RecipeDetailSerializer(chunk, many=True, context=context).data
+
+
+def iter_ndjson(recipes: Iterable[dict]) -> Iterator[str]:
+    for recipe in recipes:
+        yield json.dumps(recipe, cls=JSONEncoder) + "\n"
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv(recipes: Iterable[dict]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for recipe in recipes:
+        row = {**recipe,
+               "tags": "|".join(tag["name"] for tag in recipe["tags"]),
+               "ingredients": "|".join(ingredient["name"] for ingredient in recipe["ingredients"])}
+        yield writer.writerow([row[column] if row[column] is not None else "" for column in CSV_COLUMNS])
+
+
+async def aiter_text(parts: Iterator[str], batch_size: int = None) -> AsyncIterator[str]:
+    """Yield the parts joined batch_size at a time, advancing the sync iterator on the request's thread
+
+    Under ASGI, Django reads a sync streaming iterator to the end before sending
+    anything, so the whole export would be held in memory.
+    """
+    batch_size = batch_size or EXPORT_CHUNK_SIZE
+    take = sync_to_async(lambda: list(islice(parts, batch_size)), thread_sensitive=True)
+    try:
+        while batch := await take():
+            yield "".join(batch)
+    finally:
+        # Releases the server-side cursor when the client goes away early
+        await sync_to_async(parts.close, thread_sensitive=True)()
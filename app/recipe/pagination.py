@@ -0,0 +1,121 @@
+from base64 import b64decode, b64encode
+from typing import Sequence
+from urllib import parse
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_position(row, ordering: Sequence[str]) -> tuple:
+    """Return the values of the ordering fields of a model instance or .values() row"""
+    names = [field.removeprefix("-") for field in ordering]
+    if isinstance(row, dict):
+        return tuple(row[name] for name in names)
+    return tuple(getattr(row, name) for name in names)
+
+
+def get_keyset_filter(ordering: Sequence[str], position: Sequence) -> Q:
+    """Return the filter of the rows after position in the ordering, whose last field must be unique"""
+    condition, equal = Q(), {}
+    for field, value in zip(ordering, position):
+        name = field.removeprefix("-")
+        condition |= Q(**equal, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+        equal[name] = value
+    return condition
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Cursor pagination keyed on every ordering field
+
+    DRF's CursorPagination only keys on the first ordering field and skips the
+    rows tying with it by an offset, which is capped by offset_cutoff, so pages
+    past enough ties repeat forever. Here the cursor holds the value of every
+    ordering field, the last of which must be unique, and the next page is the
+    rows after it in the lexicographic order. No offset is ever needed.
+    """
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """Let the view pick the keyset ordering, e.g. by search rank"""
+        get_cursor_ordering = getattr(view, "get_cursor_ordering", None)
+        if get_cursor_ordering is not None:
+            return tuple(get_cursor_ordering())
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            try:
+                queryset = queryset.filter(get_keyset_filter(ordering, self.cursor.position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, self.cursor is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # An empty previous page leads back to the rows after its cursor
+        position = get_position(self.page[-1], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.cursor.position))
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=get_position(self.page[0], self.ordering)))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode("ascii")).decode("ascii"), keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        position = tokens.get("p")
+        if position is not None and len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {"p": [str(value) for value in cursor.position]}
+        if cursor.reverse:
+            tokens["r"] = "1"
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """Keyset pagination for recipes, newest first"""
+    ordering = ("-id",)
+
+
+class RecipeAttrCursorPagination(KeysetCursorPagination):
+    """Keyset pagination for tags and ingredients, ordered by name"""
+    ordering = ("-name", "-id",)
@@ -1,51 +1,120 @@
+from typing import Iterable
+
+from django.db import models, transaction
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
 from core.models import Recipe, Tag, User, Ingredient
-
-
-class TagSerializer(serializers.ModelSerializer):
+from core.serializers import TimedDataMixin, TimedListSerializer
+
+
+def get_or_create_by_name(model: type[models.Model], user: User, names: Iterable[str]) -> dict[str, models.Model]:
+    """Return the user's objects keyed by name, creating the missing ones in one batch"""
+    names = set(names)
+    if len(names) == 0:
+        return {}
+    found = {obj.name: obj for obj in model.objects.filter(user=user, name__in=names)}
+    missing = [name for name in names if name not in found]
+    if len(missing) != 0:
+        # A concurrent request may insert the same names first, so re-read instead of trusting returned pks
+        model.objects.bulk_create([model(user=user, name=name) for name in missing], ignore_conflicts=True)
+        found.update((obj.name, obj) for obj in model.objects.filter(user=user, name__in=missing))
+    return found
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin keeping only the requested fields
+
+    fields: names to keep, in the serializer's own order. expand: relations rendered as nested
+    objects, the other kept relations become lists of ids. None keeps the default for either.
+    """
+    expandable_fields: tuple[str, ...] = ()
+
+    def __init__(self, *args, fields: Iterable[str] = None, expand: Iterable[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name in set(self.expandable_fields).intersection(self.fields).difference(expand):
+                self.fields[name] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Serializer for the ingredient object"""
 
     class Meta:
         model = Ingredient
         fields = ("id", "name",)
         read_only_fields = ("id",)
+        list_serializer_class = TimedListSerializer
+
+
+class TagCountSerializer(TagSerializer):
+    """Serializer for a tag annotated with the number of recipes using it"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = (*TagSerializer.Meta.fields, "recipe_count",)
+
 
+class IngredientCountSerializer(IngredientSerializer):
+    """Serializer for an ingredient annotated with the number of recipes using it"""
+    recipe_count = serializers.IntegerField(read_only=True)
 
-class RecipeSerializer(ModelSerializer):
+    class Meta(IngredientSerializer.Meta):
+        fields = (*IngredientSerializer.Meta.fields, "recipe_count",)
+
+
+class RecipeSerializer(SparseFieldsetMixin, TimedDataMixin, ModelSerializer):
     """Serializer for the recipe object"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    expandable_fields = ("tags", "ingredients",)
 
     class Meta:
         model = Recipe
         fields = ("id", "title", "time_minutes", "price", "link", "tags", "ingredients",)
         read_only_fields = ("id",)
+        list_serializer_class = TimedListSerializer
 
-    def __get_or_create_tag(self, tags: list[dict], recipe: Recipe) -> Recipe:
-        """Get or create a tag"""
+    def __get_or_create_by_name(self, model: type[models.Model], items: list[dict]) -> list:
+        """Get the user's objects by name, creating the missing ones in one batch"""
         auth_user: User = self.context["request"].user
-        for tag in tags:
-            new_tag, _ = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(new_tag)
+        names = list(dict.fromkeys(item["name"] for item in items))
+        found = get_or_create_by_name(model, auth_user, names)
+        return [found[name] for name in names]
+
+    def __get_or_create_tag(self, tags: list[dict], recipe: Recipe) -> Recipe:
+        """Get or create tags and link them to the recipe"""
+        recipe.tags.add(*self.__get_or_create_by_name(Tag, tags))
         return recipe
 
     def __get_or_create_ingredient(self, ingredients: list[dict], recipe: Recipe) -> Recipe:
-        """Get or create an ingredient"""
-        auth_user: User = self.context["request"].user
-        for ingredient in ingredients:
-            new_ingredient, _ = Ingredient.objects.get_or_create(user=auth_user, **ingredient)
-            recipe.ingredients.add(new_ingredient)
+        """Get or create ingredients and link them to the recipe"""
+        recipe.ingredients.add(*self.__get_or_create_by_name(Ingredient, ingredients))
         return recipe
 
+    def __sync_by_name(self, manager, model: type[models.Model], items: list[dict]) -> None:
+        """Link exactly the given items, writing only the through rows that changed"""
+        wanted = {obj.id: obj for obj in self.__get_or_create_by_name(model, items)}
+        current = {obj.id for obj in manager.all()}
+        stale = current - wanted.keys()
+        if len(stale) != 0:
+            manager.remove(*stale)
+        added = [obj for obj_id, obj in wanted.items() if obj_id not in current]
+        if len(added) != 0:
+            manager.add(*added)
+
+    @transaction.atomic
     def create(self, validated_data: dict):
         """Create a recipe"""
         tags = validated_data.pop("tags", [])
@@ -55,30 +124,69 @@ class RecipeSerializer(ModelSerializer):
         self.__get_or_create_ingredient(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict):
-        """Update a recipe"""
-        tags = validated_data.pop("tags", [])
-        ingredients = validated_data.pop("ingredients", [])
+        """Update a recipe, leaving relations that were not sent untouched"""
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
         recipe = super().update(instance, validated_data)
-        recipe.tags.clear()
-        recipe.ingredients.clear()
-        self.__get_or_create_ingredient(ingredients, recipe)
-        self.__get_or_create_tag(tags, recipe)
+        if tags is not None:
+            self.__sync_by_name(recipe.tags, Tag, tags)
+        if ingredients is not None:
+            self.__sync_by_name(recipe.ingredients, Ingredient, ingredients)
         return recipe
 
 
-class RecipeDetailSerializer(RecipeSerializer):
-    """Serializer for the recipe detail object"""
+class RecipeBulkListSerializer(TimedListSerializer):
+    """List serializer validating every item on its own and keeping per-item errors"""
+
+    def to_internal_value(self, data) -> list[tuple[int, dict]]:
+        """Return (index, validated data) of the valid items, storing the others in item_errors"""
+        if not isinstance(data, list):
+            raise serializers.ValidationError({"non_field_errors": ["Expected a list of items."]})
+        self.item_errors = {}
+        valid = []
+        for index, item in enumerate(data):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+        return valid
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """Serializer for one item of a bulk recipe request"""
 
     class Meta(RecipeSerializer.Meta):
-        fields = (*RecipeSerializer.Meta.fields, "description", "image",)
+        list_serializer_class = RecipeBulkListSerializer
+
 
+class RecipeDetailSerializer(RecipeSerializer):
+    """Serializer for the recipe detail object"""
+    image_variants = serializers.SerializerMethodField()
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+    class Meta(RecipeSerializer.Meta):
+        fields = (*RecipeSerializer.Meta.fields, "description", "image", "image_status", "image_variants",)
+        read_only_fields = (*RecipeSerializer.Meta.read_only_fields, "image_status",)
+
+    def get_image_variants(self, recipe: Recipe) -> dict[str, dict[str, str]]:
+        """Return the URL of every processed image variant, keyed by variant then format"""
+        request = self.context.get("request")
+        storage = recipe.image.storage
+        urls = {}
+        for variant, files in recipe.image_variants.items():
+            urls[variant] = {}
+            for ext, name in files.items():
+                url = storage.url(name)
+                urls[variant][ext] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+
+class RecipeImageSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
 
     class Meta:
         model = Recipe
-        fields = ("id", "image",)
-        read_only_fields = ("id",)
+        fields = ("id", "image", "image_status",)
+        read_only_fields = ("id", "image_status",)
         extra_kwargs = {"image": {"required": True}}
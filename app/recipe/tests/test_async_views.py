@@ -0,0 +1,175 @@
+"""
+Test the coroutine read views answer exactly like the synchronous ones
+"""
+import asyncio
+from decimal import Decimal
+from types import ModuleType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import include, path, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.routers import DefaultRouter
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import get_generation_key
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+# Headers that must match between both paths
+COMPARED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "X-Cache", "Allow", "Vary", "WWW-Authenticate")
+
+
+def detail_url(recipe_id) -> str:
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def make_async_urlconf():
+    """Return a URLconf routing to the viewsets built with ASYNC_READ_VIEWS set"""
+    router = DefaultRouter()
+    router.register('recipes', RecipeViewSet)
+    router.register('tags', TagViewSet)
+    router.register('ingredients', IngredientViewSet)
+    with override_settings(ASYNC_READ_VIEWS=True):
+        urls = router.urls
+    urlconf = ModuleType("async_urls")
+    urlconf.urlpatterns = [path('api/recipe/', include((urls, 'recipe')))]
+    return urlconf
+
+
+class AsyncReadViewTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.async_urlconf = make_async_urlconf()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("async@example.com", "testpass123")
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [Tag.objects.create(user=cls.user, name=name) for name in ("Vegan", "Quick")]
+        ingredients = [Ingredient.objects.create(user=cls.user, name=name) for name in ("Salt", "Rice")]
+        for index in range(3):
+            recipe = Recipe.objects.create(user=cls.user, title=f"Recipe {index}", time_minutes=10 * (index + 1),
+                                           price=Decimal(f"{index}.50"), description="Tasty")
+            recipe.tags.add(*tags[:index + 1])
+            recipe.ingredients.add(*ingredients[:index])
+        cls.recipe = recipe
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        cls.other_recipe = Recipe.objects.create(user=other, title="Other", time_minutes=1, price=Decimal("1"))
+
+    def setUp(self):
+        self.headers = {"Authorization": f"Token {self.token.key}"}
+
+    async def get_both(self, url: str, params: dict = None, headers: dict = None):
+        """Return the (sync, async) responses to the same GET, each computed from an empty response cache"""
+        headers = {**self.headers, **(headers or {})}
+        await self.clear_response_cache()
+        sync_response = await self.__sync_get(url, params, headers)
+        await self.clear_response_cache()
+        with override_settings(ROOT_URLCONF=self.async_urlconf):
+            async_response = await AsyncClient().get(url, params or {}, headers=headers)
+        return sync_response, async_response
+
+    async def clear_response_cache(self):
+        """Drop every cached response, keeping the generation the ETags are derived from"""
+        cache = caches[settings.RESPONSE_CACHE]
+        await cache.aclear()
+        await cache.aset(get_generation_key(self.user.pk), 1, None)
+
+    async def __sync_get(self, url: str, params: dict, headers: dict):
+        return await sync_to_async(APIClient().get)(url, params or {}, headers=headers)
+
+    def assertSameResponse(self, sync_response, async_response):
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        for header in COMPARED_HEADERS:
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+
+    def test_read_routes_are_coroutines(self):
+        for url in (RECIPES_URL, detail_url(self.recipe.id), TAGS_URL, INGREDIENTS_URL):
+            with self.subTest(url=url):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url, self.async_urlconf).func))
+                self.assertFalse(asyncio.iscoroutinefunction(resolve(url).func))
+
+    async def test_recipe_list(self):
+        for params in ({}, {"page_size": 1}, {"ordering": "-price"}, {"tags": "1,2", "match": "all"},
+                       {"fields": "id,title,tags", "expand": ""}, {"time_minutes__gte": 20},
+                       {"ordering": "title"}, {"fields": "bogus"}):
+            with self.subTest(params=params):
+                self.assertSameResponse(*await self.get_both(RECIPES_URL, params))
+
+    async def test_recipe_list_next_page(self):
+        sync_response, _ = await self.get_both(RECIPES_URL, {"page_size": 1})
+        self.assertSameResponse(*await self.get_both(sync_response.json()["next"]))
+
+    async def test_recipe_list_cached(self):
+        """Test a second async request is served from the response cache"""
+        _, first = await self.get_both(RECIPES_URL)
+        with override_settings(ROOT_URLCONF=self.async_urlconf):
+            client = AsyncClient()
+            second = await client.get(RECIPES_URL, headers=self.headers)
+            not_modified = await client.get(RECIPES_URL, headers={**self.headers, "If-None-Match": first["ETag"]})
+
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_recipe_detail(self):
+        for url, params in ((detail_url(self.recipe.id), {}), (detail_url(self.recipe.id), {"fields": "title,tags"}),
+                            (detail_url(self.other_recipe.id), {}), (detail_url("abc"), {})):
+            with self.subTest(url=url, params=params):
+                self.assertSameResponse(*await self.get_both(url, params))
+
+    async def test_recipe_detail_not_modified(self):
+        _, response = await self.get_both(detail_url(self.recipe.id))
+
+        sync_response, not_modified = await self.get_both(detail_url(self.recipe.id),
+                                                          headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertSameResponse(sync_response, not_modified)
+
+    async def test_tags_and_ingredients(self):
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            for params in ({}, {"with_counts": 1}, {"assigned_only": 1}, {"page_size": 1}):
+                with self.subTest(url=url, params=params):
+                    self.assertSameResponse(*await self.get_both(url, params))
+
+    async def test_unauthenticated(self):
+        for headers in ({"Authorization": ""}, {"Authorization": "Token invalid"}, {"Authorization": "Token"}):
+            with self.subTest(headers=headers):
+                sync_response, async_response = await self.get_both(RECIPES_URL, headers=headers)
+                self.assertEqual(async_response.status_code, 401)
+                self.assertSameResponse(sync_response, async_response)
+
+    async def test_browsable_api(self):
+        """Test content negotiation still picks the browsable API renderer"""
+        _, response = await self.get_both(RECIPES_URL, headers={"Accept": "text/html"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+
+    async def test_writes_use_sync_view(self):
+        with override_settings(ROOT_URLCONF=self.async_urlconf):
+            response = await AsyncClient().post(RECIPES_URL, {"title": "Async", "time_minutes": 5, "price": "1.00"},
+                                                content_type="application/json", headers=self.headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Recipe.objects.filter(user=self.user, title="Async").aexists())
+
+    async def test_server_timing_counts_queries(self):
+        """Test the metrics middleware sees the queries of a coroutine view"""
+        await self.clear_response_cache()
+        with override_settings(ROOT_URLCONF=self.async_urlconf, SERVER_TIMING_HEADER=True):
+            response = await AsyncClient().get(TAGS_URL, headers=self.headers)
+
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
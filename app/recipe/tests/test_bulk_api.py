@@ -0,0 +1,139 @@
+import json
+
+from decimal import Decimal
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_payload(title: str, **params) -> dict:
+    payload = {"title": title, "time_minutes": 10, "price": "5.00"}
+    payload.update(params)
+    return payload
+
+
+class BulkRecipeApiTests(TestCase):
+    """Test the bulk recipe endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("bulk@example.com", "testpass123")
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_with_per_item_errors(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+        payload = [
+            recipe_payload("Soup", tags=[{"name": "Vegan"}], ingredients=[{"name": "Salt"}]),
+            {"title": "Missing fields"},
+            recipe_payload("Salad", tags=[{"name": "Vegan"}, {"name": "Quick"}]),
+        ]
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data["results"]
+        self.assertEqual([r["status"] for r in results], [201, 400, 201])
+        self.assertIn("time_minutes", results[1]["errors"])
+
+        soup = Recipe.objects.get(id=results[0]["id"])
+        salad = Recipe.objects.get(id=results[2]["id"])
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual([t.name for t in soup.tags.all()], ["Vegan"])
+        self.assertEqual([i.name for i in soup.ingredients.all()], ["Salt"])
+        self.assertEqual(sorted(t.name for t in salad.tags.all()), ["Quick", "Vegan"])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_query_count_independent_of_size(self):
+        def create(count: int) -> int:
+            payload = [recipe_payload(f"Recipe {count} {i}", tags=[{"name": f"Tag {i}"}],
+                                      ingredients=[{"name": f"Ingredient {i}"}]) for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload, format="json")
+            self.assertEqual(len(res.data["results"]), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(2), create(50))
+
+    def test_bulk_create_ndjson(self):
+        body = "\n".join(json.dumps(recipe_payload(title)) for title in ("One", "Two")) + "\n"
+        res = self.client.post(BULK_URL, body, content_type="application/x-ndjson")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["status"] for r in res.data["results"]], [201, 201])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_invalidates_list_cache(self):
+        self.client.get(RECIPES_URL)
+        self.client.post(BULK_URL, [recipe_payload("Soup")], format="json")
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_bulk_update(self):
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        soup = Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+        soup.ingredients.add(salt)
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        foreign = Recipe.objects.create(user=other, title="Stew", time_minutes=5, price=Decimal("1.00"))
+
+        payload = [
+            {"id": soup.id, "title": "Hot soup", "ingredients": [{"name": "Pepper"}]},
+            {"id": foreign.id, "title": "Mine now"},
+            {"title": "No id"},
+        ]
+        res = self.client.patch(BULK_URL, payload, format="json")
+
+        self.assertEqual([r["status"] for r in res.data["results"]], [200, 404, 400])
+        soup.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual(soup.title, "Hot soup")
+        self.assertEqual(soup.time_minutes, 5)
+        self.assertEqual([i.name for i in soup.ingredients.all()], ["Pepper"])
+        self.assertEqual(foreign.title, "Stew")
+
+    def test_bulk_delete(self):
+        soup = Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+        stew = Recipe.objects.create(user=self.user, title="Stew", time_minutes=5, price=Decimal("1.00"))
+
+        res = self.client.delete(BULK_URL, [soup.id, {"id": stew.id}, 999999, "x"], format="json")
+
+        self.assertEqual([r["status"] for r in res.data["results"]], [204, 204, 404, 400])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_delete_invalidates_once(self):
+        """Test the cached lists are invalidated once per bulk delete, not once per recipe"""
+        ids = [Recipe.objects.create(user=self.user, title=f"Soup {n}", time_minutes=5, price=Decimal("1.00")).id
+               for n in range(3)]
+
+        with patch("recipe.cache.bump_generation") as patched_bump, self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(BULK_URL, ids, format="json")
+
+        self.assertEqual([r["status"] for r in res.data["results"]], [204, 204, 204])
+        # Once right away and once after the commit
+        self.assertEqual(patched_bump.call_count, 2)
+
+    def test_bulk_rejects_bool_ids(self):
+        """Test JSON true and false are not taken for the ids 1 and 0"""
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+        Recipe.objects.filter(id=recipe.id).update(id=1)
+
+        res = self.client.delete(BULK_URL, [True, {"id": False}], format="json")
+        self.assertEqual([r["status"] for r in res.data["results"]], [400, 400])
+        self.assertTrue(Recipe.objects.filter(id=1).exists())
+
+        res = self.client.patch(BULK_URL, [{"id": True, "title": "Stew"}], format="json")
+        self.assertEqual([r["status"] for r in res.data["results"]], [400])
+        self.assertEqual(Recipe.objects.get(id=1).title, "Soup")
+
+    def test_bulk_rejects_non_list(self):
+        res = self.client.post(BULK_URL, recipe_payload("Soup"), format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,85 @@
+import tempfile
+
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import response_cache_stats
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class ResponseCacheTests(TestCase):
+    """Test the per-user versioned list cache"""
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        response_cache_stats.reset()
+        self.user = get_user_model().objects.create_user("cache@example.com", "testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+
+    def test_repeated_list_is_served_from_cache(self):
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(response_cache_stats.as_dict(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_query_params_are_normalized(self):
+        self.client.get(RECIPES_URL, {"tags": "1", "match": "all"})
+        res = self.client.get(f"{RECIPES_URL}?match=all&tags=1")
+        self.assertEqual(res["X-Cache"], "HIT")
+
+        res = self.client.get(RECIPES_URL, {"tags": "2", "match": "all"})
+        self.assertEqual(res["X-Cache"], "MISS")
+
+    def test_write_invalidates_list(self):
+        self.client.get(RECIPES_URL)
+        Recipe.objects.create(user=self.user, title="Stew", time_minutes=5, price=Decimal("1.00"))
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_link_change_invalidates_list(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["tags"], [{"id": tag.id, "name": "Vegan"}])
+        self.assertEqual(self.client.get(TAGS_URL)["X-Cache"], "MISS")
+
+    def test_other_user_write_keeps_cache(self):
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        self.client.get(RECIPES_URL)
+        Recipe.objects.create(user=other, title="Stew", time_minutes=5, price=Decimal("1.00"))
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+            with override_settings(CACHES={**settings.CACHES, "responses": file_cache}):
+                self.client.get(RECIPES_URL)
+                self.assertEqual(self.client.get(RECIPES_URL)["X-Cache"], "HIT")
+
+                self.recipe.delete()
+                res = self.client.get(RECIPES_URL)
+                self.assertEqual(res["X-Cache"], "MISS")
+                self.assertEqual(res.data["results"], [])
@@ -0,0 +1,173 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.views import RecipeViewSet
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id: int):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag / Last-Modified handling on recipes"""
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE].clear()
+        self.user = get_user_model().objects.create_user("etag@example.com", "testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.recipe.tags.add(self.tag)
+
+    def test_detail_not_modified(self):
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res["ETag"]
+        self.assertIn("Last-Modified", res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res.content, b"")
+
+    def test_detail_if_modified_since(self):
+        res = self.client.get(detail_url(self.recipe.id))
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=res["Last-Modified"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_linked_tag(self):
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+        self.tag.name = "Vegetarian"
+        self.tag.save()
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tags"][0]["name"], "Vegetarian")
+
+        self.recipe.tags.clear()
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def assertModifiedBy(self, change):
+        """Assert an If-Modified-Since from before the change gets the recipe again"""
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Recipe, Tag, Ingredient):
+            model.objects.update(updated_at=hour_ago)
+        last_modified = self.client.get(detail_url(self.recipe.id))["Last-Modified"]
+
+        change()
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["Last-Modified"], last_modified)
+
+    def test_last_modified_on_unlink(self):
+        self.assertModifiedBy(lambda: self.recipe.tags.remove(self.tag))
+
+    def test_last_modified_on_reverse_clear(self):
+        self.assertModifiedBy(lambda: self.tag.recipe_set.clear())
+
+    def test_last_modified_on_linking_older_item(self):
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
+        self.assertModifiedBy(lambda: ingredient.recipe_set.add(self.recipe))
+
+    def test_last_modified_on_linked_item_delete(self):
+        url = reverse("recipe:tag-detail", args=[self.tag.id])
+        self.assertModifiedBy(lambda: self.assertEqual(self.client.delete(url).status_code,
+                                                       status.HTTP_204_NO_CONTENT))
+
+    def test_other_user_recipe_not_found(self):
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        recipe = Recipe.objects.create(user=other, title="Stew", time_minutes=5, price=Decimal("1.00"))
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_if_match(self):
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+
+        res = self.client.patch(detail_url(self.recipe.id), {"title": "Soup 2"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+        res = self.client.patch(detail_url(self.recipe.id), {"title": "Soup 3"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "Soup 2")
+
+    def test_list_not_modified_until_write(self):
+        res = self.client.get(RECIPES_URL)
+        etag = res["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Recipe.objects.create(user=self.user, title="Stew", time_minutes=5, price=Decimal("1.00"))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs row locks")
+class ConcurrentConditionalUpdateTests(TransactionTestCase):
+    """Test If-Match updates racing on the same ETag"""
+
+    def test_concurrent_updates_with_same_etag(self):
+        """Test a write landing between another request's precondition check and save fails the precondition"""
+        user = get_user_model().objects.create_user("race@example.com", "testpass123")
+        recipe = Recipe.objects.create(user=user, title="Soup", time_minutes=5, price=Decimal("1.00"))
+        client = APIClient()
+        client.force_authenticate(user)
+        etag = client.get(detail_url(recipe.id))["ETag"]
+        checked, release = threading.Event(), threading.Event()
+        perform_update = RecipeViewSet.perform_update
+        statuses = {}
+
+        def pausing_perform_update(view, serializer):
+            # The first request holds here, past its precondition check, while the second one runs
+            if threading.current_thread().name == "first":
+                checked.set()
+                release.wait(5)
+            perform_update(view, serializer)
+
+        def patch_title(title: str):
+            thread_client = APIClient()
+            thread_client.force_authenticate(user)
+            try:
+                res = thread_client.patch(detail_url(recipe.id), {"title": title}, HTTP_IF_MATCH=etag)
+                statuses[title] = res.status_code
+            finally:
+                connections.close_all()
+
+        with patch.object(RecipeViewSet, "perform_update", pausing_perform_update):
+            first = threading.Thread(target=patch_title, args=("First",), name="first")
+            second = threading.Thread(target=patch_title, args=("Second",), name="second")
+            first.start()
+            checked.wait(5)
+            second.start()
+            second.join(1)
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(statuses, {"First": status.HTTP_200_OK, "Second": status.HTTP_412_PRECONDITION_FAILED})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "First")
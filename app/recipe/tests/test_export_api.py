@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import AsyncClient, TestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.serializers import RecipeDetailSerializer
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def read_stream(res) -> str:
+    return b"".join(res.streaming_content).decode()
+
+
+class ExportApiTests(TestCase):
+    """Test the streaming recipe export"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("export@example.com", "testpass123")
+        self.client.force_authenticate(self.user)
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(user=self.user, title=f"Recipe {i}", time_minutes=i, price=Decimal("1.50"))
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"Tag {i}"))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f"Ingredient {i}"))
+            self.recipes.append(recipe)
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        Recipe.objects.create(user=other, title="Foreign", time_minutes=1, price=Decimal("1.00"))
+
+    def test_export_ndjson(self):
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res, StreamingHttpResponse)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in read_stream(res).splitlines()]
+        expected = [json.loads(json.dumps(RecipeDetailSerializer(recipe).data)) for recipe in reversed(self.recipes)]
+        self.assertEqual(lines, expected)
+
+    def test_export_csv(self):
+        res = self.client.get(EXPORT_URL, {"export_format": "csv"})
+
+        self.assertEqual(res["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(read_stream(res))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["title"], "Recipe 4")
+        self.assertEqual(rows[0]["tags"], "Tag 4")
+        self.assertEqual(rows[0]["price"], "1.50")
+
+    def test_export_bad_format(self):
+        res = self.client.get(EXPORT_URL, {"export_format": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("recipe.export.EXPORT_CHUNK_SIZE", 2)
+    def test_export_prefetches_per_chunk(self):
+        """Test the recipes come from one cursor and every chunk costs one prefetch per relation"""
+        res = self.client.get(EXPORT_URL)
+        with self.assertNumQueries(1 + 3 * 2):
+            lines = read_stream(res).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    @patch("recipe.export.EXPORT_CHUNK_SIZE", 2)
+    def test_export_without_server_side_cursors(self):
+        with patch.dict(connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}):
+            res = self.client.get(EXPORT_URL, {"tags": str(self.recipes[1].tags.get().id)})
+            lines = [json.loads(line) for line in read_stream(res).splitlines()]
+        self.assertEqual([line["id"] for line in lines], [self.recipes[1].id])
+
+    @patch("recipe.export.EXPORT_CHUNK_SIZE", 2)
+    def test_export_without_server_side_cursors_keeps_ordering(self):
+        """Test paging without a cursor follows the list ordering and search rank, with ties broken by id"""
+        for recipe in self.recipes[:2]:
+            Recipe.objects.filter(id=recipe.id).update(time_minutes=9)
+        self.recipes[1].description = "Recipe of recipes"
+        self.recipes[1].save()
+        with patch.dict(connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}):
+            for params in ({"ordering": "time_minutes"}, {"ordering": "-time_minutes"}, {"search": "recipe"}):
+                with self.subTest(params=params):
+                    listed = self.client.get(reverse('recipe:recipe-list'), {**params, "page_size": 100})
+                    res = self.client.get(EXPORT_URL, params)
+                    lines = [json.loads(line) for line in read_stream(res).splitlines()]
+                    self.assertEqual(len(lines), 5)
+                    self.assertEqual([line["id"] for line in lines], [r["id"] for r in listed.data["results"]])
+
+    @patch("recipe.export.EXPORT_CHUNK_SIZE", 2)
+    async def test_export_asgi_streams_asynchronously(self):
+        """Test the ASGI export is an async iterator, which Django streams instead of reading into a list"""
+        token = await Token.objects.acreate(user=self.user)
+        res = await AsyncClient().get(EXPORT_URL, headers={"Authorization": f"Token {token.key}"})
+
+        self.assertTrue(res.is_async)
+        content = b"".join([part async for part in res.streaming_content]).decode()
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([line["id"] for line in lines], [recipe.id for recipe in reversed(self.recipes)])
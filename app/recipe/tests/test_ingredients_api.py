@@ -8,6 +8,7 @@ from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+SUGGEST_URL = reverse("recipe:ingredient-suggest")
 
 
 def get_detail_url(i_id):
@@ -49,7 +50,7 @@ class PrivateIngredientsApiTests(TestCase):
         i: Ingredient = Ingredient.objects.all()
 
         serializer = IngredientSerializer(i, many=True)
-        self.assertEqual(serializer.data, res.data)
+        self.assertEqual(serializer.data, res.data["results"])
 
     def test_ingredients_limited(self):
         """Test that ingredients are limited to authenticated user"""
@@ -59,8 +60,8 @@ class PrivateIngredientsApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], i.name)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], i.name)
 
     def test_patch_ingredient(self):
         """Test patch an ingredient"""
@@ -94,8 +95,8 @@ class PrivateIngredientsApiTests(TestCase):
         s1 = IngredientSerializer(i1)
         s2 = IngredientSerializer(i2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertNotIn(s2.data, res.data["results"])
 
     def test_filtered_ingredients_assigned_unique(self):
         """Test filtering ingredients by assigned returns unique items"""
@@ -118,6 +119,29 @@ class PrivateIngredientsApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], i.name)
-        self.assertEqual(res.data[0]["id"], i.id)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], i.name)
+        self.assertEqual(res.data["results"][0]["id"], i.id)
+
+    def test_ingredients_with_counts_assigned_only(self):
+        """Test with_counts combined with assigned_only"""
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="Pepper")
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_minutes=10, price=10)
+        recipe.ingredients.add(salt)
+
+        res = self.client.get(INGREDIENTS_URL, {"with_counts": 1, "assigned_only": 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [{"id": salt.id, "name": "Salt", "recipe_count": 1}])
+
+    def test_suggest_ingredients(self):
+        """Test ingredient suggestions are limited to the user and ranked"""
+        tomato = Ingredient.objects.create(user=self.user, name="Tomato")
+        Ingredient.objects.create(user=self.user, name="Potato")
+        Ingredient.objects.create(user=create_user("other@example.com", "pass1234"), name="Tomato")
+
+        res = self.client.get(SUGGEST_URL, {"q": "tom", "limit": 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{"id": tomato.id, "name": "Tomato", "recipe_count": 0}])
@@ -1,9 +1,13 @@
 import os.path
 import tempfile
+from unittest.mock import MagicMock, patch
 
 from _decimal import Decimal
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.reverse import reverse
@@ -11,7 +15,9 @@ from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
 from core.models import User
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import ORDERING_FIELDS, RANGE_FILTERS
 from PIL import Image
 
 RECIPES_URL = reverse('recipe:recipe-list')
@@ -76,7 +82,7 @@ class PrivateRecipeApiTests(TestCase):
 
         recipes = Recipe.objects.all().order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_recipes_limited_to_user(self):
         other = create_user(email="limit@example.com",
@@ -89,7 +95,7 @@ class PrivateRecipeApiTests(TestCase):
 
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test retrieving a recipe detail"""
@@ -326,10 +332,10 @@ class PrivateRecipeApiTests(TestCase):
                                 price=Decimal(5.00))
         res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}"})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
-        self.assertNotIn(RecipeSerializer(recipe3).data, res.data)
-        self.assertIn(RecipeSerializer(recipe2).data, res.data)
-        self.assertIn(RecipeSerializer(recipe1).data, res.data)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertNotIn(RecipeSerializer(recipe3).data, res.data["results"])
+        self.assertIn(RecipeSerializer(recipe2).data, res.data["results"])
+        self.assertIn(RecipeSerializer(recipe1).data, res.data["results"])
 
     def test_filter_by_ingredients_self(self):
         recipe1 = create_recipe(user=self.user,
@@ -350,10 +356,38 @@ class PrivateRecipeApiTests(TestCase):
                                 price=Decimal(5.00))
         res = self.client.get(RECIPES_URL, {"ingredients": f"{i1.id},{i2.id}"})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
-        self.assertNotIn(RecipeSerializer(recipe3).data, res.data)
-        self.assertIn(RecipeSerializer(recipe2).data, res.data)
-        self.assertIn(RecipeSerializer(recipe1).data, res.data)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertNotIn(RecipeSerializer(recipe3).data, res.data["results"])
+        self.assertIn(RecipeSerializer(recipe2).data, res.data["results"])
+        self.assertIn(RecipeSerializer(recipe1).data, res.data["results"])
+
+    def test_filter_by_tags_match_all(self):
+        """Test match=all returns only recipes having every given tag"""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Vegan")
+        both = create_recipe(user=self.user, title="Both")
+        both.tags.add(tag1, tag2)
+        one = create_recipe(user=self.user, title="One")
+        one.tags.add(tag1)
+
+        res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}", "match": "all"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["results"]], [both.id])
+
+        res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [one.id, both.id])
+
+    def test_filter_by_tags_and_ingredients_no_duplicates(self):
+        """Test a recipe matching several filter ids is returned once"""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Vegan")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+        recipe.ingredients.add(salt)
+
+        res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}", "ingredients": f"{salt.id}"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
 
     def test_filter_error(self):
         create_recipe(user=self.user,
@@ -362,7 +396,7 @@ class PrivateRecipeApiTests(TestCase):
                       price=Decimal(5.00))
         res = self.client.get(RECIPES_URL, {"tags": "AMOGUS"})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data["results"]), 1)
 
 
 class ImageUploadTests(TestCase):
@@ -391,6 +425,50 @@ class ImageUploadTests(TestCase):
         self.assertIn("image", res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_upload_image_exposes_variants(self):
+        url = get_image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            img: Image = Image.new("RGB", (10, 10))
+            img.save(image_file, format="JPEG")
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {"image": image_file}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["image_status"], Recipe.ImageStatus.PENDING)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data["image_status"], Recipe.ImageStatus.READY)
+        self.assertTrue(res.data["image_variants"]["thumbnail"]["webp"].startswith("http"))
+
+        self.recipe.refresh_from_db()
+        for files in self.recipe.image_variants.values():
+            for name in files.values():
+                self.recipe.image.storage.delete(name)
+
+    @patch("recipe.views.enqueue_recipe_image")
+    def test_upload_image_discards_old_variants(self, patched_enqueue: MagicMock):
+        """Test the variants of the replaced image are cleared and their files deleted"""
+        storage = self.recipe.image.storage
+        old_thumbnail = storage.save("uploads/recipe/old_thumbnail.webp", ContentFile(b"old"))
+        self.recipe.image_variants = {"thumbnail": {"webp": old_thumbnail}}
+        self.recipe.save()
+
+        url = get_image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {"image": image_file}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.PENDING)
+        self.assertEqual(self.recipe.image_variants, {})
+        self.assertFalse(storage.exists(old_thumbnail))
+        patched_enqueue.assert_called_once_with(self.recipe.id)
+
     def test_upload_image_bad(self):
         url = get_image_upload_url(self.recipe.id)
         payload = {
@@ -398,3 +476,310 @@ class ImageUploadTests(TestCase):
         }
         res = self.client.post(url, payload, format="multipart")
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test that the recipe endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="queries@example.com", password="testpass")
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count: int):
+        """Create recipes with a tag and an ingredient each"""
+        start = Recipe.objects.filter(user=self.user).count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"Tag {i}"))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f"Ingredient {i}"))
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not run a query per recipe"""
+        self.create_recipes(1)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 1)
+
+        self.create_recipes(10)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 11)
+
+    def test_create_query_count_independent_of_tags(self):
+        """Test creating a recipe batches the tag and ingredient writes"""
+        def create_with(count: int) -> int:
+            payload = {
+                "title": f"Recipe with {count}",
+                "time_minutes": 10,
+                "price": Decimal("5.00"),
+                "tags": [{"name": f"Tag {count} {i}"} for i in range(count)],
+                "ingredients": [{"name": f"Ingredient {count} {i}"} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data["tags"]), count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create_with(1), create_with(30))
+
+    def test_create_reuses_and_dedupes_tags(self):
+        """Test existing tags are reused and repeated names are linked once"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        payload = {
+            "title": "Salad",
+            "time_minutes": 5,
+            "price": Decimal("2.00"),
+            "tags": [{"name": "Vegan"}, {"name": "Quick"}, {"name": "Vegan"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_noop_update_does_not_write_join_tables(self):
+        """Test resending the same tags and ingredients leaves the through tables alone"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+        payload = {
+            "tags": [{"name": tag.name} for tag in recipe.tags.all()],
+            "ingredients": [{"name": ingredient.name} for ingredient in recipe.ingredients.all()],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        join_tables = (Recipe.tags.through._meta.db_table, Recipe.ingredients.through._meta.db_table)
+        write_prefixes = tuple(f'{verb} "{table}"' for table in join_tables
+                               for verb in ("INSERT INTO", "UPDATE", "DELETE FROM"))
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith(write_prefixes)]
+        self.assertEqual(writes, [])
+
+    def test_update_only_changes_diff(self):
+        """Test updating tags removes and adds only the changed links"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+        kept = recipe.tags.get()
+        payload = {"tags": [{"name": kept.name}, {"name": "Added"}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual({t["name"] for t in res.data["tags"]}, {kept.name, "Added"})
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_patch_without_relations_keeps_them(self):
+        """Test a PATCH that omits tags and ingredients does not touch them"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+        res = self.client.patch(detail_url(recipe.id), {"title": "Renamed"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_detail_query_count(self):
+        """Test retrieving a recipe prefetches its tags and ingredients"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+        # The ETag/Last-Modified validators take one query, the serialized recipe three
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data["tags"]), 1)
+        self.assertEqual(len(res.data["ingredients"]), 1)
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="pages@example.com", password="testpass")
+        self.client.force_authenticate(self.user)
+
+    def test_page_size_and_next_cursor(self):
+        """Test pages follow the -id ordering through the next cursor"""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipes[4].id, recipes[3].id])
+        self.assertIsNone(res.data["previous"])
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipes[2].id, recipes[1].id])
+
+    def test_cursor_stable_under_inserts(self):
+        """Test recipes created after the first page do not shift the next page"""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(4)]
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+        create_recipe(user=self.user, title="Newest")
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipes[1].id, recipes[0].id])
+
+    def test_page_size_capped(self):
+        """Test the page_size parameter cannot exceed the maximum"""
+        for i in range(3):
+            create_recipe(user=self.user, title=f"Recipe {i}")
+
+        with patch.object(RecipeCursorPagination, "max_page_size", 2):
+            res = self.client.get(RECIPES_URL, {"page_size": 1000})
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_pages_through_ties_past_offset_cutoff(self):
+        """Test more equal ordering values than DRF's offset cutoff are all reached once, without an OFFSET"""
+        Recipe.objects.bulk_create(Recipe(user=self.user, title=f"Recipe {i}", time_minutes=5, price=Decimal("1"))
+                                   for i in range(1300))
+        expected = list(Recipe.objects.filter(user=self.user).order_by("id").values_list("id", flat=True))
+
+        seen = []
+        res = self.client.get(RECIPES_URL, {"ordering": "time_minutes", "page_size": 200})
+        while True:
+            seen += [r["id"] for r in res.data["results"]]
+            if res.data["next"] is None:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(res.data["next"])
+            self.assertFalse(any("OFFSET" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor(self):
+        """Test the previous link of a page leads back to the page before it"""
+        recipes = [create_recipe(user=self.user, time_minutes=5) for _ in range(5)]
+
+        first = self.client.get(RECIPES_URL, {"ordering": "-time_minutes", "page_size": 2})
+        second = self.client.get(first.data["next"])
+        res = self.client.get(second.data["previous"])
+
+        self.assertEqual([r["id"] for r in second.data["results"]], [recipes[2].id, recipes[1].id])
+        self.assertEqual(res.data["results"], first.data["results"])
+        self.assertIsNone(res.data["previous"])
+
+    def test_invalid_cursor(self):
+        for cursor in ("not-base64", "cD1hYmM="):
+            with self.subTest(cursor=cursor):
+                res = self.client.get(RECIPES_URL, {"cursor": cursor})
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeRangeAndOrderingTests(TestCase):
+    """Test range filters and the ordering parameter of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="ranges@example.com", password="testpass")
+        self.client.force_authenticate(self.user)
+
+    def test_range_filters(self):
+        """Test time_minutes and price bounds are inclusive and combine"""
+        quick_cheap = create_recipe(user=self.user, time_minutes=5, price=Decimal("2.00"))
+        quick_dear = create_recipe(user=self.user, time_minutes=10, price=Decimal("20.00"))
+        create_recipe(user=self.user, time_minutes=60, price=Decimal("3.00"))
+
+        res = self.client.get(RECIPES_URL, {"time_minutes__lte": 10})
+        self.assertCountEqual([r["id"] for r in res.data["results"]], [quick_cheap.id, quick_dear.id])
+
+        res = self.client.get(RECIPES_URL, {"time_minutes__lte": 10, "price__gte": "2.50"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [quick_dear.id])
+
+    def test_invalid_range_value(self):
+        """Test a non-numeric bound is rejected"""
+        res = self.client.get(RECIPES_URL, {"price__lte": "cheap"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price__lte", res.data)
+
+    def test_ordering_pages_through_ties(self):
+        """Test ordering by price keeps recipes with equal prices on consistent pages"""
+        prices = ["3.00", "1.00", "2.00", "1.00", "2.00"]
+        recipes = [create_recipe(user=self.user, price=Decimal(price)) for price in prices]
+        expected = [r.id for r in sorted(recipes, key=lambda r: (-r.price, -r.id))]
+
+        seen = []
+        res = self.client.get(RECIPES_URL, {"ordering": "-price", "page_size": 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [r["id"] for r in res.data["results"]]
+            if res.data["next"] is None:
+                break
+            res = self.client.get(res.data["next"])
+        self.assertEqual(seen, expected)
+
+        res = self.client.get(RECIPES_URL, {"ordering": "time_minutes"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [r.id for r in recipes])
+
+    def test_ordering_rejected(self):
+        """Test fields without an index, and ordering search results, are rejected"""
+        for params in ({"ordering": "title"}, {"ordering": "--price"}, {"ordering": "price", "search": "cake"}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn("ordering", res.data)
+
+    def test_orderings_and_ranges_are_indexed(self):
+        """Test every ordering and range field leads a composite index after user"""
+        indexed = {tuple(index.fields[:2]) for index in Recipe._meta.indexes}
+        for field in (*ORDERING_FIELDS, *RANGE_FILTERS):
+            self.assertTrue({("user", field), ("user", f"-{field}")} & indexed, field)
+
+
+class RecipeSparseFieldsetTests(TestCase):
+    """Test the fields and expand parameters"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="sparse@example.com", password="testpass")
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user, title="Pancakes", description="Fluffy")
+        self.tag = Tag.objects.create(user=self.user, name="Breakfast")
+        self.ingredient = Ingredient.objects.create(user=self.user, name="Flour")
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def test_list_fields_single_narrow_query(self):
+        """Test a list of plain fields selects only their columns and prefetches nothing"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {"fields": "id,title"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [{"id": self.recipe.id, "title": "Pancakes"}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("price", queries[0]["sql"])
+
+    def test_list_fields_with_ordering(self):
+        """Test the ordering field is loaded for the cursor without extra queries"""
+        create_recipe(user=self.user, title="Waffles", price=Decimal("1.00"))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {"fields": "title", "ordering": "price", "page_size": 1})
+
+        self.assertEqual(res.data["results"], [{"title": "Waffles"}])
+        res = self.client.get(res.data["next"])
+        self.assertEqual(res.data["results"], [{"title": "Pancakes"}])
+
+    def test_expand(self):
+        """Test relations missing from expand are returned as ids"""
+        res = self.client.get(RECIPES_URL, {"fields": "tags,ingredients", "expand": "tags"})
+
+        self.assertEqual(res.data["results"], [{
+            "tags": [{"id": self.tag.id, "name": "Breakfast"}],
+            "ingredients": [self.ingredient.id],
+        }])
+
+        res = self.client.get(detail_url(self.recipe.id), {"expand": ""})
+        self.assertEqual(res.data["tags"], [self.tag.id])
+        self.assertEqual(res.data["description"], "Fluffy")
+
+    def test_detail_fields(self):
+        """Test detail-only fields can be picked and change the ETag"""
+        full = self.client.get(detail_url(self.recipe.id))
+        res = self.client.get(detail_url(self.recipe.id), {"fields": "description,image_variants"})
+
+        self.assertEqual(res.data, {"description": "Fluffy", "image_variants": {}})
+        self.assertNotEqual(res["ETag"], full["ETag"])
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown fields and expansions are rejected"""
+        for params in ({"fields": "id,secret"}, {"fields": "description"}, {"expand": "title"}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
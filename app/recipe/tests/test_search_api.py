@@ -0,0 +1,107 @@
+from unittest import skipUnless
+
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.search import refresh_search_vectors
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, title: str, **params) -> Recipe:
+    defaults = {"time_minutes": 10, "price": Decimal("5.00")}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, title=title, **defaults)
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test the recipe search parameter"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("search@example.com", "testpass123")
+        self.client.force_authenticate(self.user)
+
+    def search(self, text: str) -> list[int]:
+        res = self.client.get(RECIPES_URL, {"search": text})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["id"] for recipe in res.data["results"]]
+
+    def test_search_title_and_description(self):
+        cake = create_recipe(self.user, "Chocolate cake")
+        mousse = create_recipe(self.user, "Mousse", description="Dark chocolate dessert")
+        create_recipe(self.user, "Tomato soup")
+
+        self.assertCountEqual(self.search("chocolate"), [cake.id, mousse.id])
+
+    def test_search_tag_and_ingredient_names(self):
+        soup = create_recipe(self.user, "Soup")
+        salad = create_recipe(self.user, "Salad")
+        soup.tags.add(Tag.objects.create(user=self.user, name="Winter"))
+        salad.ingredients.add(Ingredient.objects.create(user=self.user, name="Cucumber"))
+
+        self.assertEqual(self.search("winter"), [soup.id])
+        self.assertEqual(self.search("cucumber"), [salad.id])
+
+    def test_search_follows_tag_changes(self):
+        soup = create_recipe(self.user, "Soup")
+        tag = Tag.objects.create(user=self.user, name="Winter")
+        soup.tags.add(tag)
+
+        tag.name = "Autumn"
+        tag.save()
+        self.assertEqual(self.search("autumn"), [soup.id])
+
+        tag.recipe_set.clear()
+        self.assertEqual(self.search("autumn"), [])
+
+    def test_search_all_terms_required(self):
+        cake = create_recipe(self.user, "Chocolate cake")
+        create_recipe(self.user, "Carrot cake")
+
+        self.assertEqual(self.search("chocolate cake"), [cake.id])
+
+    def test_search_limited_to_user(self):
+        other = get_user_model().objects.create_user("other@example.com", "testpass123")
+        create_recipe(other, "Chocolate cake")
+
+        self.assertEqual(self.search("chocolate"), [])
+
+    @skipUnless(connection.vendor == "postgresql", "Ranking needs Postgres full-text search")
+    def test_search_ranked_by_weight(self):
+        in_description = create_recipe(self.user, "Mousse", description="chocolate")
+        in_title = create_recipe(self.user, "Chocolate cake")
+
+        self.assertEqual(self.search("chocolate"), [in_title.id, in_description.id])
+
+    @skipUnless(connection.vendor == "postgresql", "Ranking needs Postgres full-text search")
+    def test_search_pages_by_rank(self):
+        for i in range(3):
+            create_recipe(self.user, f"Chocolate {i}", description="chocolate " * i)
+
+        res = self.client.get(RECIPES_URL, {"search": "chocolate", "page_size": 2})
+        first = [recipe["id"] for recipe in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        second = [recipe["id"] for recipe in res.data["results"]]
+        self.assertEqual(len(set(first + second)), 3)
+
+    def test_search_pages_through_tied_ranks(self):
+        """Test more equal ranks than DRF's offset cutoff are all reached once, ties newest first"""
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=self.user, title="Chocolate cake", time_minutes=10, price=Decimal("5.00")) for _ in range(1300))
+        refresh_search_vectors([recipe.id for recipe in recipes])
+
+        seen = []
+        res = self.client.get(RECIPES_URL, {"search": "chocolate", "page_size": 200})
+        while True:
+            seen += [recipe["id"] for recipe in res.data["results"]]
+            if res.data["next"] is None:
+                break
+            res = self.client.get(res.data["next"])
+        self.assertEqual(seen, sorted((recipe.id for recipe in recipes), reverse=True))
@@ -1,5 +1,8 @@
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
@@ -8,6 +11,7 @@ from core.models import Tag, User, Recipe
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+SUGGEST_URL = reverse('recipe:tag-suggest')
 
 
 def create_user(email="asdasd@example.com", password="adsd23r", **params):
@@ -51,7 +55,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user"""
@@ -61,8 +65,8 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag.name)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], tag.name)
 
     def test_update_tag(self):
         """Test updating a tag"""
@@ -74,6 +78,16 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload["name"])
 
+    def test_update_tag_to_existing_name(self):
+        """Test renaming a tag onto another tag's name is rejected"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        tag = Tag.objects.create(user=self.user, name="Dessert")
+        res = self.client.patch(detail_url(tag.id), {"name": "Vegan"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "Dessert")
+
     def test_delete_tag(self):
         """Test deleting a tag"""
         tag = Tag.objects.create(user=self.user, name="Test Tag")
@@ -93,8 +107,8 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertNotIn(serializer2.data, res.data["results"])
 
     def test_filtered_tag_assigned_to_recipes(self):
         """Test filtering tags by those assigned to recipes"""
@@ -112,6 +126,101 @@ class PrivateTagsApiTests(TestCase):
         recipe2.tags.add(tag1)
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
 
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag1.name)
-        self.assertEqual(res.data[0]["id"], tag1.id)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], tag1.name)
+        self.assertEqual(res.data["results"][0]["id"], tag1.id)
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paged by name, then id"""
+        Tag.objects.create(user=self.user, name="Apple")
+        Tag.objects.create(user=self.user, name="Cherry")
+        Tag.objects.create(user=self.user, name="Banana")
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Cherry", "Banana"])
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Apple"])
+        self.assertIsNone(res.data["next"])
+
+    def test_tags_with_counts(self):
+        """Test with_counts returns recipe usage in a single query"""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        for title in ("Eggs", "Toast"):
+            recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=10, price=10)
+            recipe.tags.add(tag1)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {"with_counts": 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [
+            {"id": tag2.id, "name": "Lunch", "recipe_count": 0},
+            {"id": tag1.id, "name": "Breakfast", "recipe_count": 2},
+        ])
+
+    def test_invalid_flags(self):
+        """Test with_counts and assigned_only other than 0 or 1 are rejected"""
+        for param in ("with_counts", "assigned_only"):
+            with self.subTest(param=param):
+                res = self.client.get(TAGS_URL, {param: "abc"})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(param, res.data)
+
+    def test_suggest_prefix_matches_by_usage(self):
+        """Test suggestions put prefix matches first, then the most used"""
+        rare = Tag.objects.create(user=self.user, name="Vegetarian")
+        popular = Tag.objects.create(user=self.user, name="Vegan")
+        inner = Tag.objects.create(user=self.user, name="Not vegan")
+        Tag.objects.create(user=self.user, name="Dessert")
+        Tag.objects.create(user=create_user(email="other@example.com"), name="Vegan")
+        recipe = Recipe.objects.create(user=self.user, title="Salad", time_minutes=10, price=10)
+        recipe.tags.add(popular)
+
+        res = self.client.get(SUGGEST_URL, {"q": "veg"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t["id"] for t in res.data], [popular.id, rare.id, inner.id])
+        self.assertEqual(res.data[0]["recipe_count"], 1)
+
+    def test_suggest_limit_keeps_most_used(self):
+        """Test the limit is applied after ranking by usage, not by name"""
+        for name in ("Soup A", "Soup B"):
+            Tag.objects.create(user=self.user, name=name)
+        popular = Tag.objects.create(user=self.user, name="Soup Z")
+        recipe = Recipe.objects.create(user=self.user, title="Salad", time_minutes=10, price=10)
+        recipe.tags.add(popular)
+
+        res = self.client.get(SUGGEST_URL, {"q": "soup", "limit": 1})
+
+        self.assertEqual([t["id"] for t in res.data], [popular.id])
+
+    def test_suggest_short_text_matches_prefixes(self):
+        """Test texts too short for trigrams only match the start of names"""
+        prefixed = Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Not vegan")
+
+        res = self.client.get(SUGGEST_URL, {"q": "ve"})
+
+        self.assertEqual([t["id"] for t in res.data], [prefixed.id])
+
+    @override_settings(SUGGEST_MAX_LIMIT=2)
+    def test_suggest_limit(self):
+        """Test the number of suggestions is capped"""
+        for name in ("Soup", "Sour", "Sorbet"):
+            Tag.objects.create(user=self.user, name=name)
+
+        self.assertEqual(len(self.client.get(SUGGEST_URL, {"q": "so", "limit": 1}).data), 1)
+        self.assertEqual(len(self.client.get(SUGGEST_URL, {"q": "so", "limit": 100}).data), 2)
+        self.assertEqual(self.client.get(SUGGEST_URL, {"q": ""}).data, [])
+
+    @skipUnless(connection.vendor == "postgresql", "Fuzzy matching needs pg_trgm")
+    def test_suggest_tolerates_typos(self):
+        """Test suggestions include names similar to a misspelled query"""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+
+        res = self.client.get(SUGGEST_URL, {"q": "brekfast"})
+
+        self.assertEqual([t["id"] for t in res.data], [tag.id])
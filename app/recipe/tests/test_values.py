@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeSerializer
+from recipe.values import RecipeValuesSerializer, as_values
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeValuesEquivalenceTests(TestCase):
+    """Test RecipeValuesSerializer renders exactly what RecipeSerializer renders"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("values@example.com", "testpass123")
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ("Vegan", "Café", "Quick")]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name) for name in ("Salt", "Crème fraîche")]
+        samples = [
+            ("Soup", 30, Decimal("4.50"), "https://example.com/soup", tags[:2], ingredients),
+            ("Crêpes   du jour", 15, Decimal("0.00"), "", tags[1:], ingredients[1:]),
+            ("Feast", 240, Decimal("999.99"), "", [], []),
+            ("Toast", 5, Decimal("12.5"), "", tags, []),
+        ]
+        for title, time_minutes, price, link, recipe_tags, recipe_ingredients in samples:
+            recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=time_minutes,
+                                           price=price, link=link)
+            recipe.tags.add(*recipe_tags)
+            recipe.ingredients.add(*recipe_ingredients)
+        self.queryset = Recipe.objects.filter(user=self.user).order_by("-id")
+
+    def assertEquivalent(self, fields=None, expand=None):
+        columns = ("id", "name") if expand is None else ("id",)
+        recipes = self.queryset.prefetch_related(Prefetch("tags", queryset=Tag.objects.only(*columns)),
+                                                 Prefetch("ingredients", queryset=Ingredient.objects.only(*columns)))
+        expected = RecipeSerializer(recipes, many=True, fields=fields, expand=expand).data
+        actual = RecipeValuesSerializer(as_values(self.queryset, fields), fields=fields, expand=expand).data
+        self.assertEqual(actual, [dict(recipe) for recipe in expected])
+        self.assertEqual([list(recipe) for recipe in actual], [list(recipe) for recipe in expected])
+
+    def test_full_representation(self):
+        self.assertEquivalent()
+
+    def test_sparse_fields(self):
+        for fields in (("id",), ("title", "price"), ("tags",), ("price", "id", "ingredients")):
+            with self.subTest(fields=fields):
+                self.assertEquivalent(fields=fields)
+
+    def test_unexpanded_relations(self):
+        self.assertEquivalent(expand=())
+        self.assertEquivalent(fields=("id", "tags"), expand=())
+
+    def test_empty(self):
+        self.assertEqual(RecipeValuesSerializer(as_values(Recipe.objects.none())).data, [])
+
+    @override_settings(REST_FRAMEWORK={"COERCE_DECIMAL_TO_STRING": False})
+    def test_decimal_not_coerced(self):
+        self.assertEquivalent(fields=("price",))
+
+    def test_list_responses_identical(self):
+        """Test the list endpoint renders the same bytes with and without the values path"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for params in ({}, {"page_size": 2}, {"fields": "title,tags", "expand": ""}, {"ordering": "-price"},
+                       {"search": "soup"}, {"time_minutes__lte": 30, "tags": Tag.objects.first().id}):
+            responses = []
+            for from_values in (True, False):
+                caches[settings.RESPONSE_CACHE].clear()
+                with override_settings(RECIPE_LIST_FROM_VALUES=from_values):
+                    responses.append(client.get(RECIPES_URL, params).content)
+            with self.subTest(params=params):
+                self.assertEqual(responses[0], responses[1])
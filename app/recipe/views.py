@@ -1,15 +1,77 @@
 from abc import ABC
+from typing import Optional
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet, Prefetch, Exists, OuterRef, Subquery, Count
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ChoiceField, DecimalField, IntegerField
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from core import models
+from core.async_views import AsyncReadViewSetMixin
+from core.authentication import CachedTokenAuthentication
+from core.images import discard_image_variants, enqueue_recipe_image
+from core.search import search_recipes, suggest_by_name
 from recipe import serializers
+from recipe.bulk import bulk_create_recipes, bulk_delete_recipes, bulk_update_recipes
+from recipe.cache import CachedListMixin
+from recipe.conditional import (aget_recipe_validators, get_not_modified_response, get_recipe_validators,
+                                lock_recipe, set_validators)
+from recipe.export import aiter_text, iter_csv, iter_ndjson, iter_serialized
+from recipe.parsers import NDJSONParser
+from recipe.values import RecipeValuesSerializer, as_values
+from recipe.pagination import RecipeCursorPagination, RecipeAttrCursorPagination
+
+# Every ordering field is served by a (user, field, id) index, see Recipe.Meta.indexes
+ORDERING_FIELDS = ("id", "time_minutes", "price",)
+
+RANGE_FILTERS = {
+    "time_minutes": IntegerField(),
+    "price": DecimalField(max_digits=5, decimal_places=2),
+}
+
+
+def is_recipe_id(value) -> bool:
+    """Return whether a JSON value is an integer id, JSON true and false parse to bool, an int subclass"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# Validates the 0/1 flags of the tag and ingredient lists
+FLAG_FIELD = ChoiceField(choices=(0, 1))
+
+# Actions honouring the fields= and expand= sparse fieldset parameters
+SPARSE_ACTIONS = ("list", "retrieve",)
+
+# Model columns read by serialized fields that are not a column of the same name
+FIELD_COLUMNS = {
+    "image_variants": ("image", "image_variants",),
+    "tags": (),
+    "ingredients": (),
+}
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter("fields",
+                     type=OpenApiTypes.STR,
+                     description="Comma separated fields to return, all by default"),
+    OpenApiParameter("expand",
+                     type=OpenApiTypes.STR,
+                     description="Comma separated relations (tags, ingredients) returned as objects, " +
+                                 "the others are returned as ids. All by default"),
+]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+    "csv": ("text/csv", iter_csv),
+}
 
 
 # Create your views here.
@@ -25,15 +87,34 @@ from recipe import serializers
                              type=OpenApiTypes.STR,
                              description="Filter recipes by ingredients id. " +
                                          "Enter comma seperated values in GET request"),
+            OpenApiParameter("match",
+                             type=OpenApiTypes.STR,
+                             enum=["any", "all"],
+                             description="Return recipes having any (default) or all of the given tags/ingredients"),
+            OpenApiParameter("search",
+                             type=OpenApiTypes.STR,
+                             description="Full-text search over title, description, tag and ingredient names. " +
+                                         "Results are ranked by relevance"),
+            *[OpenApiParameter(param, type=OpenApiTypes.NUMBER, description=f"Only recipes with {param} {bound}")
+              for param, bound in (("time_minutes__gte", "at least"), ("time_minutes__lte", "at most"),
+                                   ("price__gte", "at least"), ("price__lte", "at most"))],
+            OpenApiParameter("ordering",
+                             type=OpenApiTypes.STR,
+                             enum=[f"{prefix}{field}" for field in ORDERING_FIELDS for prefix in ("", "-")],
+                             description="Sort field, prefix with - for descending. Newest first by default"),
+            *SPARSE_PARAMETERS,
         ],
     ),
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedListMixin, AsyncReadViewSetMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = serializers.RecipeDetailSerializer
-    queryset: QuerySet = models.Recipe.objects.all()
-    authentication_classes = [TokenAuthentication, ]
+    queryset: QuerySet = models.Recipe.objects.defer("search_vector")
+    authentication_classes = [CachedTokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
+    pagination_class = RecipeCursorPagination
+    LIST_FIELDS = ("id", "title", "time_minutes", "price", "link",)
 
     def __params_to_ints(self, qs: str) -> frozenset[int]:
         """Convert an id string to a set of integers"""
@@ -52,13 +133,133 @@ class RecipeViewSet(viewsets.ModelViewSet):
         tags_ids: frozenset[int] = self.__params_to_ints(tags_or_none)
         ingredients_ids: frozenset[int] = self.__params_to_ints(ingredients_or_none)
 
+        match_all: bool = self.request.query_params.get('match') == "all"
+
+        queryset = self.__get_action_queryset()
+        queryset = self.__filter_linked(queryset, models.Recipe.tags.through, "tag_id", tags_ids, match_all)
+        queryset = self.__filter_linked(queryset, models.Recipe.ingredients.through, "ingredient_id",
+                                        ingredients_ids, match_all)
+
+        queryset = queryset.filter(user=self.request.user, **self.__range_filters())
+        if self.__search_text():
+            queryset = search_recipes(queryset, self.__search_text())
+        ordering = self.get_cursor_ordering()
+        queryset = queryset.order_by(*ordering)
+        if self.__uses_values():
+            return as_values(queryset, self.__sparse_fieldset()[0], ordering)
+        return queryset
+
+    def __uses_values(self) -> bool:
+        """Whether the list is read as .values() rows and serialized by RecipeValuesSerializer"""
+        return self.action == "list" and settings.RECIPE_LIST_FROM_VALUES
+
+    def __search_text(self) -> str:
+        return self.request.query_params.get("search", "").strip()
+
+    def __range_filters(self) -> dict:
+        """Return the lte/gte lookups sent as query params, validated like the model fields"""
+        lookups = {}
+        for field_name, field in RANGE_FILTERS.items():
+            for bound in ("lte", "gte"):
+                param = f"{field_name}__{bound}"
+                value = self.request.query_params.get(param)
+                if value is None:
+                    continue
+                try:
+                    lookups[param] = field.to_internal_value(value)
+                except ValidationError as exc:
+                    raise ValidationError({param: exc.detail})
+        return lookups
+
+    def get_cursor_ordering(self) -> tuple[str, ...]:
+        """Return the ordering used for the queryset and its pagination cursor
+
+        Only index-backed fields are accepted, so no request makes Postgres sort all the user's recipes.
+        """
+        ordering = self.request.query_params.get("ordering")
+        if self.__search_text():
+            if ordering is not None:
+                raise ValidationError({"ordering": ["Search results are ordered by relevance."]})
+            return "-rank", "-id"
+        if ordering is None:
+            return "-id",
+        field = ordering.removeprefix("-")
+        if field not in ORDERING_FIELDS:
+            raise ValidationError({"ordering": [f"Choose one of: {', '.join(ORDERING_FIELDS)}."]})
+        prefix = "-" if ordering.startswith("-") else ""
+        if field == "id":
+            return f"{prefix}id",
+        return f"{prefix}{field}", f"{prefix}id"
+
+    def __filter_linked(self, queryset: QuerySet, through, column: str, ids: frozenset[int],
+                        match_all: bool) -> QuerySet:
+        """Keep recipes linked to any (or all) of the ids, using EXISTS so no row is duplicated"""
+        if len(ids) == 0:
+            return queryset
+        links = through.objects.filter(recipe_id=OuterRef("pk"))
+        if not match_all:
+            return queryset.filter(Exists(links.filter(**{f"{column}__in": ids})))
+        for linked_id in ids:
+            queryset = queryset.filter(Exists(links.filter(**{column: linked_id})))
+        return queryset
+
+    def __get_action_queryset(self) -> QuerySet:
+        """Return the base queryset with the columns and relations the current action serializes"""
         queryset = self.queryset
-        if len(tags_ids) != 0:
-            queryset = queryset.filter(tags__id__in=tags_ids)
-        if len(ingredients_ids) != 0:
-            queryset = queryset.filter(ingredients__id__in=ingredients_ids)
+        if self.action == "upload_image" or self.__uses_values():
+            return queryset
+        if self.action == "list":
+            queryset = queryset.only(*self.LIST_FIELDS)
+        fields, expand = self.__sparse_fieldset()
+        if fields is not None:
+            queryset = queryset.only(*self.__columns(fields))
+        prefetches = []
+        for name, model in (("tags", models.Tag), ("ingredients", models.Ingredient)):
+            if fields is not None and name not in fields:
+                continue
+            columns = ("id", "name") if expand is None or name in expand else ("id",)
+            prefetches.append(Prefetch(name, queryset=model.objects.only(*columns)))
+        return queryset.prefetch_related(*prefetches)
+
+    def __columns(self, fields: tuple[str, ...]) -> set[str]:
+        """Return the recipe columns needed to serialize the fields"""
+        columns = {"id"}
+        for name in fields:
+            columns.update(FIELD_COLUMNS.get(name, (name,)))
+        if self.action == "list":
+            # The pagination cursor is read from the ordering fields of the last row
+            columns.update(field.removeprefix("-") for field in self.get_cursor_ordering() if field != "-rank")
+        return columns
 
-        return queryset.filter(user=self.request.user).order_by("-id").distinct()
+    def __split_param(self, name: str) -> Optional[tuple[str, ...]]:
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return tuple(item.strip() for item in value.split(",") if item.strip())
+
+    def __sparse_fieldset(self) -> tuple[Optional[tuple[str, ...]], Optional[tuple[str, ...]]]:
+        """Return the validated (fields, expand) parameters, None where the default applies"""
+        if self.action not in SPARSE_ACTIONS:
+            return None, None
+        fields, expand = self.__split_param("fields"), self.__split_param("expand")
+        for param, values, allowed in (("fields", fields, self.get_serializer_class().Meta.fields),
+                                       ("expand", expand, serializers.RecipeSerializer.expandable_fields)):
+            unknown = [value for value in values or () if value not in allowed]
+            if len(unknown) != 0:
+                raise ValidationError(
+                    {param: [f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(allowed)}."]})
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, narrowed to the requested sparse fieldset"""
+        fields, expand = self.__sparse_fieldset()
+        if self.__uses_values() and kwargs.get("many"):
+            return RecipeValuesSerializer(*args, fields=fields, expand=expand, context=self.get_serializer_context())
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        if expand is not None:
+            kwargs.setdefault("expand", expand)
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -66,19 +267,150 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         if self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        if self.action == "bulk":
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe, or 304 if the client copy is still current"""
+        return self.__conditional(super().retrieve, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Async counterpart of retrieve"""
+        validators = await aget_recipe_validators(request, self.kwargs[self.lookup_field])
+        if validators is not None:
+            not_modified = get_not_modified_response(request, *validators)
+            if not_modified is not None:
+                return not_modified
+        response = await super().aretrieve(request, *args, **kwargs)
+        if validators is not None and response.status_code == status.HTTP_200_OK:
+            set_validators(response, *validators)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """Update a recipe, honouring If-Match for optimistic concurrency"""
+        return self.__conditional(super().update, request, *args, **kwargs)
+
+    def __conditional(self, handler, request, *args, **kwargs):
+        """Evaluate the request preconditions before running the handler"""
+        if request.method == "GET":
+            return self.__run_conditional(handler, request, *args, **kwargs)
+        # Locked from the precondition to the write, so requests with the same If-Match cannot both pass
+        with transaction.atomic():
+            lock_recipe(request, self.kwargs[self.lookup_field])
+            return self.__run_conditional(handler, request, *args, **kwargs)
+
+    def __run_conditional(self, handler, request, *args, **kwargs):
+        validators = get_recipe_validators(request, self.kwargs[self.lookup_field])
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        not_modified = get_not_modified_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            if request.method != "GET":
+                validators = get_recipe_validators(request, self.kwargs[self.lookup_field])
+            set_validators(response, *validators)
+        return response
+
     def perform_create(self, serializer: serializers.RecipeSerializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    @extend_schema(request=serializers.RecipeBulkSerializer(many=True), responses=OpenApiTypes.OBJECT)
+    @action(methods=["POST", "PATCH", "DELETE"], detail=False, url_path="bulk",
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """Create (POST), partially update (PATCH) or delete (DELETE) many recipes at once
+
+        Takes a JSON array or NDJSON stream. PATCH items carry their "id", DELETE takes ids.
+        Returns one result per item, in request order.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of items."]})
+        if len(items) > settings.RECIPE_BULK_MAX_ITEMS:
+            raise ValidationError(
+                {"non_field_errors": [f"At most {settings.RECIPE_BULK_MAX_ITEMS} items per request."]})
+
+        if request.method == "DELETE":
+            results = self.__bulk_delete(items)
+        else:
+            results = self.__bulk_save(items, partial=request.method == "PATCH")
+        return Response({"results": sorted(results, key=lambda result: result["index"])}, status=status.HTTP_200_OK)
+
+    def __bulk_save(self, items: list, partial: bool) -> list[dict]:
+        serializer: serializers.RecipeBulkListSerializer = self.get_serializer(data=items, many=True, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        results = [{"index": index, "status": status.HTTP_400_BAD_REQUEST, "errors": errors}
+                   for index, errors in serializer.item_errors.items()]
+        if not partial:
+            created = bulk_create_recipes(self.request.user, [data for _, data in serializer.validated_data])
+            results += [{"index": index, "status": status.HTTP_201_CREATED, "id": recipe.id}
+                        for (index, _), recipe in zip(serializer.validated_data, created)]
+            return results
+
+        to_update = []
+        for index, data in serializer.validated_data:
+            recipe_id = items[index].get("id")
+            if not is_recipe_id(recipe_id):
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST,
+                                "errors": {"id": ["This field is required."]}})
+            else:
+                to_update.append((index, recipe_id, data))
+        updated = bulk_update_recipes(self.request.user, [(recipe_id, data) for _, recipe_id, data in to_update])
+        results += [{"index": index, "id": recipe_id,
+                     "status": status.HTTP_200_OK if recipe_id in updated else status.HTTP_404_NOT_FOUND}
+                    for index, recipe_id, _ in to_update]
+        return results
+
+    def __bulk_delete(self, items: list) -> list[dict]:
+        ids = {index: item.get("id") if isinstance(item, dict) else item for index, item in enumerate(items)}
+        valid = {index: recipe_id for index, recipe_id in ids.items() if is_recipe_id(recipe_id)}
+        deleted = bulk_delete_recipes(self.request.user, list(valid.values()))
+        results = [{"index": index, "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": {"id": ["A valid integer is required."]}}
+                   for index in ids.keys() - valid.keys()]
+        results += [{"index": index, "id": recipe_id,
+                     "status": status.HTTP_204_NO_CONTENT if recipe_id in deleted else status.HTTP_404_NOT_FOUND}
+                    for index, recipe_id in valid.items()]
+        return results
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("export_format",
+                             type=OpenApiTypes.STR,
+                             enum=list(EXPORT_FORMATS),
+                             description="Export file format, ndjson by default"),
+        ],
+        responses={(200, content_type): OpenApiTypes.BINARY for content_type, _ in EXPORT_FORMATS.values()},
+    )
+    @action(methods=["GET"], detail=False, url_path="export", pagination_class=None)
+    def export(self, request):
+        """Stream every recipe of the user, honouring the tags/ingredients filters"""
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({"export_format": [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]})
+        content_type, render = EXPORT_FORMATS[export_format]
+        content = render(iter_serialized(self.get_queryset(), self.get_serializer_context()))
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_text(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="recipes.{export_format}"'
+        return response
+
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe"""
+        """Upload an image to a recipe and queue its resized variants"""
         recipe: models.Recipe = self.get_object()
         serializer: serializers.RecipeImageSerializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                # The old variants would be served for the new image until it is processed
+                discard_image_variants(recipe)
+                serializer.save(image_status=models.Recipe.ImageStatus.PENDING)
+                enqueue_recipe_image(recipe.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -90,31 +422,110 @@ class RecipeViewSet(viewsets.ModelViewSet):
                              type=OpenApiTypes.INT,
                              enum=[0, 1],
                              description="Filter tags by assigned recipes. Enter 1 or 0 in GET request"),
+            OpenApiParameter("with_counts",
+                             type=OpenApiTypes.INT,
+                             enum=[0, 1],
+                             description="Add the number of recipes using each item as recipe_count"),
         ],
     )
 )
-class BaseRecipeAttrViewSet(mixins.ListModelMixin,
+class BaseRecipeAttrViewSet(CachedListMixin,
+                            AsyncReadViewSetMixin,
+                            mixins.ListModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet,
                             ABC):
     """Base viewset for user owned recipe attributes"""
-    authentication_classes = [TokenAuthentication, ]
+    authentication_classes = [CachedTokenAuthentication, ]
     permission_classes = [IsAuthenticated, ]
+    pagination_class = RecipeAttrCursorPagination
+
+    link_model = None
+    link_column: str = None
+    count_serializer_class = None
+
+    def __flag(self, param: str) -> bool:
+        try:
+            return bool(FLAG_FIELD.to_internal_value(self.request.query_params.get(param, 0)))
+        except ValidationError as exc:
+            raise ValidationError({param: exc.detail})
+
+    def __with_counts(self) -> bool:
+        return self.__flag("with_counts")
+
+    def __annotates_counts(self) -> bool:
+        return self.action == "suggest" or (self.action == "list" and self.__with_counts())
+
+    def __get_links(self) -> QuerySet:
+        return self.link_model.objects.filter(**{self.link_column: OuterRef("pk")})
+
+    def __get_recipe_count(self) -> Coalesce:
+        counts = self.__get_links().order_by().values(self.link_column).annotate(total=Count("*")).values("total")
+        return Coalesce(Subquery(counts), 0)
 
     def get_queryset(self):
-        assigned_only = bool(int(self.request.query_params.get("assigned_only", 0)))
+        assigned_only = self.__flag("assigned_only")
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by("-name").distinct()
+            queryset = queryset.filter(Exists(self.__get_links()))
+        if self.action == "list" and self.__with_counts():
+            queryset = queryset.annotate(recipe_count=self.__get_recipe_count())
+        return queryset.filter(user=self.request.user).order_by("-name")
+
+    def get_serializer_class(self):
+        if self.__annotates_counts():
+            return self.count_serializer_class
+        return self.serializer_class
+
+    def __suggest_limit(self) -> int:
+        try:
+            limit = int(self.request.query_params.get("limit", settings.SUGGEST_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": ["A valid integer is required."]})
+        return max(1, min(limit, settings.SUGGEST_MAX_LIMIT))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("q",
+                             type=OpenApiTypes.STR,
+                             required=True,
+                             description="Name prefix or approximate name to complete"),
+            OpenApiParameter("limit",
+                             type=OpenApiTypes.INT,
+                             description="Maximum number of suggestions, capped by SUGGEST_MAX_LIMIT"),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="suggest", pagination_class=None)
+    def suggest(self, request):
+        """Return the user's items matching q, prefix matches first, then by similarity and usage"""
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response([], status=status.HTTP_200_OK)
+        queryset = suggest_by_name(self.get_queryset(), text, self.__suggest_limit(), self.__get_recipe_count())
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def perform_update(self, serializer):
+        """Reject renaming onto a name the user already has"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({"name": ["An item with this name already exists."]})
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
     queryset: QuerySet = models.Tag.objects.all()
+    link_model = models.Recipe.tags.through
+    link_column = "tag_id"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
+    count_serializer_class = serializers.IngredientCountSerializer
     queryset: QuerySet = models.Ingredient.objects.all()
+    link_model = models.Recipe.ingredients.through
+    link_column = "ingredient_id"
@@ -3,8 +3,10 @@ from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from core.serializers import TimedDataMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ('email', 'password', 'name')
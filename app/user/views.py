@@ -1,6 +1,8 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 
+from core.authentication import CachedTokenAuthentication
+
 from .serializers import UserSerializer, TokenSerializer
 
 
@@ -17,7 +19,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUsersView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -1,4 +1,8 @@
 
+    upstream app {
+        server ${APP_HOST}:${APP_PORT};
+    }
+
     server {
         listen 80;
         listen [::]:80;
@@ -19,8 +23,8 @@
         }
 
         location / {
-            uwsgi_pass ${APP_HOST}:${APP_PORT};
-            include /etc/nginx/uwsgi_params;
+            # uwsgi_pass or proxy_pass, matching the SERVER_MODE of the app
+            include /etc/nginx/app_${SERVER_MODE}.conf;
             client_max_body_size 10M;
         }
     }
@@ -0,0 +1,36 @@
+#!/bin/sh
+# Compare the uWSGI and ASGI serving modes under the same concurrent keep-alive load.
+# Run from the app directory against a migrated database, with 127.0.0.1 in
+# DJANGO_ALLOWED_HOSTS: bench_concurrency.sh [connections] [seconds]
+
+set -e
+
+CONNECTIONS=${1:-1000}
+DURATION=${2:-30}
+PORT=${BENCH_PORT:-9000}
+OUTPUT=${BENCH_OUTPUT:-/tmp/bench_concurrency}
+WORKERS=${BENCH_WORKERS:-4}
+
+mkdir -p "$OUTPUT"
+python manage.py benchmark --sizes 1000 --seed-only
+export PROMETHEUS_MULTIPROC_DIR=$(mktemp -d)
+
+bench() {
+    label=$1
+    shift
+    "$@" &
+    server=$!
+    until python -c "import urllib.request; urllib.request.urlopen('http://127.0.0.1:$PORT/health/live/')" 2>/dev/null; do
+        sleep 0.5
+    done
+    python manage.py loadtest --url "http://127.0.0.1:$PORT" --connections "$CONNECTIONS" --duration "$DURATION" \
+        --bench-size 1000 --label "$label" --output "$OUTPUT/$label.json"
+    kill "$server"
+    wait "$server" || true
+}
+
+SERVER_MODE=wsgi bench wsgi \
+    uwsgi --http-socket ":$PORT" --workers "$WORKERS" --master --enable-threads --module app.wsgi --die-on-term \
+    --listen 1024 --http-keepalive --add-header "Connection: Keep-Alive" --disable-logging
+SERVER_MODE=asgi DB_CONN_MAX_AGE=0 bench asgi \
+    uvicorn app.asgi:application --port "$PORT" --workers "$WORKERS" --lifespan off --backlog 2048 --no-access-log
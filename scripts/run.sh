@@ -6,6 +6,21 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+# Images left pending when the previous container stopped, their worker threads died with it
+python manage.py process_images &
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+# Workers share their Prometheus metrics through files, start from an empty directory
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Every ASGI request runs its sync code on a thread of its own, a persistent
+    # connection would be left behind with it. Pool with PgBouncer instead.
+    export DB_CONN_MAX_AGE=0
+    uvicorn app.asgi:application --host 0.0.0.0 --port 9000 --workers 4 --lifespan off \
+        --proxy-headers --forwarded-allow-ips '*'
+else
+    uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+fi
 